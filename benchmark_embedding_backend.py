@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Encode speed and accuracy of the CPU embedding backends (enhanced_embedding_backend)
+
+Encodes the SchemaEmbedder corpora (data-dictionary texts and data-row texts, both read from MySQL)
+with each backend. Reports load time, corpus throughput, single-question
+latency, and how closely each backend's vectors and top-k neighbours match the torch model.
+
+Usage:
+    python benchmark_embedding_backend.py
+    python benchmark_embedding_backend.py --backends torch onnx-int8 --threads 4 --max-texts 5000
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from enhanced_embedding_backend import EMBED_BACKENDS, load_embedding_model
+
+def load_texts(max_texts):
+    """(schema texts, data-row texts) as SchemaEmbedder builds them"""
+    import pandas as pd
+    schema_texts, row_texts = [], []
+    try:
+        from enhanced_db_pool import get_connection
+        conn = get_connection()
+        try:
+            data_dict = pd.read_sql('SELECT * FROM data_dictionary', conn)
+        finally:
+            conn.close()
+        schema_texts = [f"{row['Table']} {row['Column']} {row['Column Description']}" for _, row in data_dict.iterrows()]
+    except Exception as e:
+        print(f"⚠️ Could not load the data dictionary from MySQL: {e}")
+    try:
+        from enhanced_row_sync import RowSync
+        # RowSync keeps rows in memory only: download them before reading their texts
+        row_sync = RowSync()
+        row_sync.sync()
+        row_texts = row_sync.texts()[:max_texts]
+    except Exception as e:
+        print(f"⚠️ Could not load data rows from MySQL: {e}")
+    if not row_texts:
+        sys.exit("❌ No data-row texts to benchmark: check the MySQL connection and ROW_SYNC_SKIP_TABLES")
+    return schema_texts, row_texts
+
+def encode(model, texts, batch_size):
+    return np.asarray(model.encode(texts, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=list(EMBED_BACKENDS), choices=EMBED_BACKENDS)
+    parser.add_argument('--threads', type=int, default=None, help='intra-op threads (default: library default)')
+    parser.add_argument('--max-texts', type=int, default=2000, help='cap on data-row texts encoded')
+    parser.add_argument('--queries', type=int, default=50, help='single-text encodes timed for latency')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('-k', type=int, default=5, help='neighbours compared against torch')
+    args = parser.parse_args()
+
+    from enhanced_embedding import EMBED_MODEL
+    schema_texts, row_texts = load_texts(args.max_texts)
+    corpora = {'schema': schema_texts, 'data rows': row_texts}
+    queries = (schema_texts + row_texts)[:args.queries]
+    print(f"📦 {EMBED_MODEL}: {len(schema_texts)} schema texts, {len(row_texts)} data-row texts, threads={args.threads or 'default'}")
+
+    backends = ['torch'] + [b for b in args.backends if b != 'torch']
+    reference = {}
+    print("\n⚡ Embedding backend speed and accuracy vs torch")
+    print("=" * 96)
+    print(f"{'backend':<11}{'corpus':<11}{'load s':>8}{'texts/s':>10}{'q p50 ms':>10}{'q p95 ms':>10}"
+          f"{'min cos':>10}{'mean cos':>10}{'top' + str(args.k) + ' overlap':>16}")
+    for backend in backends:
+        start = time.perf_counter()
+        model, used = load_embedding_model(EMBED_MODEL, backend, args.threads)
+        load_s = time.perf_counter() - start
+        if used != backend:
+            print(f"{backend:<11}❌ unavailable, skipped")
+            continue
+        encode(model, queries[:2], args.batch_size)  # warm-up run
+        latencies = []
+        for q in queries:
+            start = time.perf_counter()
+            encode(model, [q], 1)
+            latencies.append((time.perf_counter() - start) * 1000)
+        for name, texts in corpora.items():
+            if not texts:
+                continue
+            start = time.perf_counter()
+            vectors = encode(model, texts, args.batch_size)
+            throughput = len(texts) / (time.perf_counter() - start)
+            query_vectors = encode(model, queries, args.batch_size)
+            if backend == 'torch':
+                reference[name] = (vectors, query_vectors)
+                min_cos = mean_cos = overlap = 1.0
+            else:
+                ref_vectors, ref_queries = reference[name]
+                cosine = (vectors * ref_vectors).sum(axis=1)
+                min_cos, mean_cos = float(cosine.min()), float(cosine.mean())
+                k = min(args.k, len(texts))
+                ref_top = np.argsort(-(ref_queries @ ref_vectors.T), axis=1)[:, :k]
+                top = np.argsort(-(query_vectors @ vectors.T), axis=1)[:, :k]
+                overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(top, ref_top)])
+            print(f"{backend:<11}{name:<11}{load_s:>8.2f}{throughput:>10.1f}{np.percentile(latencies, 50):>10.2f}"
+                  f"{np.percentile(latencies, 95):>10.2f}{min_cos:>10.4f}{mean_cos:>10.4f}{overlap:>16.3f}")
+
+    print("\n💡 Set EMBED_BACKEND / EMBED_INTRA_OP_THREADS in enhanced_embedding_backend.py")
+
+if __name__ == "__main__":
+    main()
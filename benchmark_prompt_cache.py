@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Prompt-eval time of SQLCoder with a warm and a cold Ollama KV cache
+
+Builds SQL prompts with build_sql_prompt (static rules / few-shots first, then the role's schema,
+then the question) and sends each one twice with num_predict=1:
+  cold - with a unique line in front, so no cached prefix matches and the whole prompt is evaluated
+  warm - right after a prompt for another question of the same role, so only the question part
+         differs from what Ollama has cached
+Run it while nothing else is using Ollama (with OLLAMA_NUM_PARALLEL > 1 requests may land in
+different cache slots).
+
+Usage:
+    python benchmark_prompt_cache.py
+    python benchmark_prompt_cache.py --role Teller --repeats 5
+"""
+
+import argparse
+import os
+import sys
+import uuid
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from enhanced_llm_client import SQL_MODEL, get_llm_client
+from enhanced_llm_interface import SQL_PROMPT_PREFIX, build_sql_prompt
+from enhanced_prompt_builder import LLM_NUM_CTX
+
+QUESTIONS = [
+    "Show me all transactions",
+    "Show me all customers",
+    "Show me transactions where amount is greater than $1000",
+    "Show me all accounts",
+    "Show average balance by account type",
+    "Count total accounts",
+]
+
+def load_schema(role):
+    """(data dictionary, allowed tables, allowed columns) for role, or for every table without one"""
+    from enhanced_db_pool import get_connection
+    conn = get_connection()
+    try:
+        data_dict = pd.read_sql('SELECT * FROM data_dictionary', conn)
+        role_access = None
+        if role:
+            role_access = pd.read_sql('SELECT * FROM role_access', conn)
+            role_access.set_index(role_access.columns[0], inplace=True)
+    finally:
+        conn.close()
+    table_cols = {t: list(rows['Column']) for t, rows in data_dict.groupby('Table', sort=False)}
+    if not role:
+        return data_dict, list(table_cols), table_cols
+    from create_role_access import get_allowed_columns, get_allowed_tables
+    tables = get_allowed_tables(role, role_access)
+    return data_dict, tables, {t: get_allowed_columns(role, t, role_access, table_cols) for t in tables}
+
+def prompt_eval(prompt):
+    """(prompt-eval ms, prompt tokens evaluated, total ms) of one num_predict=1 generation"""
+    client = get_llm_client()
+    response = client.generate({
+        "model": SQL_MODEL, "prompt": prompt, "stream": False,
+        # Same context window as the app, so Ollama doesn't reload the model between the two
+        "options": {"temperature": 0.0, "num_predict": 1, "num_ctx": LLM_NUM_CTX},
+    })
+    response.raise_for_status()
+    result = response.json()
+    return (result.get('prompt_eval_duration', 0) / 1e6, result.get('prompt_eval_count', 0),
+            client.last_call()['total_ms'])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--role', default=None, help='role whose allowed schema goes into the prompts (default: all tables)')
+    parser.add_argument('--repeats', type=int, default=3, help='passes over the sample questions')
+    args = parser.parse_args()
+
+    data_dict, tables, columns = load_schema(args.role)
+    prompts = [build_sql_prompt(q, tables, columns, data_dict)[0] for q in QUESTIONS]
+    shared = len(os.path.commonprefix(prompts))
+    print(f"📦 {len(tables)} tables, prompts of {min(map(len, prompts))}-{max(map(len, prompts))} chars; "
+          f"static prefix {len(SQL_PROMPT_PREFIX)} chars, shared by all prompts {shared} chars")
+
+    prompt_eval(prompts[-1])  # load the model so the first cold run doesn't include the load
+    results = {'cold': [], 'warm': []}
+    for _ in range(args.repeats):
+        for i, prompt in enumerate(prompts):
+            results['cold'].append(prompt_eval(f"-- run {uuid.uuid4().hex}\n" + prompt))
+            prompt_eval(prompts[i - 1])  # cache another question of the same role
+            results['warm'].append(prompt_eval(prompt))
+
+    print("\n⚡ SQLCoder prompt eval, cold vs warm KV cache")
+    print("=" * 72)
+    print(f"{'cache':<8}{'runs':>6}{'eval ms p50':>14}{'eval ms p95':>14}{'tokens evaluated':>18}{'total ms p50':>14}")
+    for name, runs in results.items():
+        eval_ms, tokens, total_ms = (np.array(col, dtype=float) for col in zip(*runs))
+        print(f"{name:<8}{len(runs):>6}{np.percentile(eval_ms, 50):>14.1f}{np.percentile(eval_ms, 95):>14.1f}"
+              f"{np.mean(tokens):>18.1f}{np.percentile(total_ms, 50):>14.1f}")
+    cold = np.median([r[0] for r in results['cold']])
+    warm = np.median([r[0] for r in results['warm']])
+    if warm > 0:
+        print(f"\n💡 Warm cache cuts median prompt eval {cold / warm:.1f}x ({cold:.0f} ms -> {warm:.0f} ms)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Recall-versus-latency report for the data-row vector index backends
+
+Compares FAISS flat / IVF / HNSW (enhanced_vector_index) against the exact cosine search the
+embedder used before (util.semantic_search ranking). A second table compares memory, latency and
+recall of float16 / int8 quantized storage (with and without float re-rank) against float32.
+Uses the cached data-row embeddings of the current embedding model when present, otherwise a
+synthetic clustered corpus.
+
+Usage:
+    python benchmark_vector_index.py                 # cached data rows (or synthetic fallback)
+    python benchmark_vector_index.py --synthetic 200000 --dim 768
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from enhanced_vector_index import (
+    ExactIndex, FaissIndex, QuantizedIndex, RerankedIndex, FAISS_AVAILABLE, normalize_rows
+)
+
+def load_corpus(args):
+    """Cached data-row vectors for the configured model, or a synthetic clustered corpus"""
+    if not args.synthetic:
+        try:
+            from enhanced_embedding import EMBED_MODEL
+            from enhanced_embedding_backend import EMBED_BACKEND, embedding_model_key
+            from enhanced_embedding_cache import EmbeddingCache
+            model_key = embedding_model_key(EMBED_MODEL, EMBED_BACKEND)
+            # One cache per table partition ('data_rows.<table>'); role-restricted views are skipped
+            probe = EmbeddingCache(model_key, 'data_rows')
+            names = sorted(glob.glob(os.path.join(probe.dir, 'data_rows.*.manifest.json')))
+            namespaces = [os.path.basename(n)[:-len('.manifest.json')] for n in names]
+            parts = [EmbeddingCache(model_key, ns)._vectors for ns in namespaces if ns.count('.') == 1]
+            parts = [np.asarray(p) for p in parts if p is not None and len(p) > 0]
+            if parts:
+                corpus = np.concatenate(parts)
+                print(f"📦 Using {len(corpus)} cached data-row embeddings of {EMBED_MODEL} ({len(parts)} tables)")
+                return corpus
+        except Exception as e:
+            print(f"⚠️ Could not load cached data-row embeddings: {e}")
+    n = args.synthetic or 50000
+    print(f"🧪 Using a synthetic corpus of {n} x {args.dim} vectors")
+    rng = np.random.default_rng(args.seed)
+    centers = rng.normal(size=(max(1, n // 100), args.dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), size=n)
+    return centers[labels] + 0.3 * rng.normal(size=(n, args.dim)).astype(np.float32)
+
+def make_queries(corpus, n_queries, seed):
+    """Perturbed corpus vectors: realistic 'near a stored row' questions without needing the model"""
+    rng = np.random.default_rng(seed + 1)
+    picks = rng.integers(0, len(corpus), size=n_queries)
+    queries = normalize_rows(corpus[picks])
+    return queries + 0.05 * rng.normal(size=queries.shape).astype(np.float32)
+
+def run(index, queries, k, truth=None):
+    latencies = []
+    results = []
+    for q in queries:
+        start = time.perf_counter()
+        ids, _ = index.search(q, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(ids)
+    recall = None
+    if truth is not None:
+        hits = sum(len(set(r.tolist()) & set(t.tolist())) for r, t in zip(results, truth))
+        recall = hits / sum(len(t) for t in truth)
+    return results, np.percentile(latencies, 50), np.percentile(latencies, 95), recall
+
+def index_bytes(index):
+    """Resident size of an index's vector storage (a re-ranked index's float vectors stay on disk)"""
+    if isinstance(index, RerankedIndex):
+        index = index.index
+    if isinstance(index, QuantizedIndex):
+        return index.nbytes
+    if isinstance(index, ExactIndex):
+        return index.vectors.nbytes
+    import faiss
+    return len(faiss.serialize_index(index.index))
+
+def quantization_report(corpus, queries, k, truth):
+    print("\n🗜️ Quantized storage: memory / latency / recall vs float32")
+    print("=" * 72)
+    print(f"{'index':<10}{'storage':<10}{'rerank':<8}{'MB':>9}{'p50 ms':>9}{'p95 ms':>9}{'recall@' + str(k):>12}")
+    configs = [('exact', None)] + [('exact', q) for q in ('float16', 'int8')]
+    if FAISS_AVAILABLE:
+        configs += [('hnsw', None)] + [('hnsw', q) for q in ('float16', 'int8')]
+    for backend, quantization in configs:
+        if backend == 'exact':
+            base = ExactIndex(corpus) if quantization is None else QuantizedIndex(corpus, quantization)
+        else:
+            base = FaissIndex.build(corpus, backend, quantization=quantization)
+        variants = [(base, '-')] if quantization is None else [(base, 'no'), (RerankedIndex(base, corpus), 'yes')]
+        for index, rerank in variants:
+            _, p50, p95, recall = run(index, queries, k, truth)
+            print(f"{backend:<10}{quantization or 'float32':<10}{rerank:<8}{index_bytes(index) / 2**20:>9.1f}"
+                  f"{p50:>9.3f}{p95:>9.3f}{recall:>12.3f}")
+    print("\n💡 Set VECTOR_QUANTIZATION / QUANTIZED_RERANK in enhanced_vector_index.py")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--synthetic', type=int, default=0, help='use a synthetic corpus of this many vectors')
+    parser.add_argument('--dim', type=int, default=384, help='dimension of synthetic vectors')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('-k', type=int, default=3, help='neighbours per query (data_row_k)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args)
+    queries = make_queries(corpus, args.queries, args.seed)
+
+    print("\n🔍 Vector index recall vs latency")
+    print("=" * 72)
+    print(f"{'backend':<10}{'params':<22}{'build s':>9}{'p50 ms':>9}{'p95 ms':>9}{'recall@' + str(args.k):>12}")
+
+    start = time.perf_counter()
+    exact = ExactIndex(corpus)
+    build_s = time.perf_counter() - start
+    truth, p50, p95, _ = run(exact, queries, args.k)
+    print(f"{'exact':<10}{'-':<22}{build_s:>9.2f}{p50:>9.3f}{p95:>9.3f}{1.0:>12.3f}")
+
+    if not FAISS_AVAILABLE:
+        print("\n❌ faiss is not installed (pip install faiss-cpu); only exact search was measured")
+        quantization_report(corpus, queries, args.k, truth)
+        return
+
+    configs = [('flat', {}, [{}])]
+    configs.append(('ivf', {}, [{'nprobe': p} for p in (1, 4, 16, 64)]))
+    configs.append(('hnsw', {'hnsw_m': 32}, [{'ef_search': ef} for ef in (16, 32, 64, 128)]))
+    for backend, build_params, search_params in configs:
+        start = time.perf_counter()
+        index = FaissIndex.build(corpus, backend, **build_params)
+        build_s = time.perf_counter() - start
+        for params in search_params:
+            index.set_search_params(**params)
+            _, p50, p95, recall = run(index, queries, args.k, truth)
+            label = ', '.join(f"{k}={v}" for k, v in {**build_params, **params}.items()) or '-'
+            print(f"{backend:<10}{label:<22}{build_s:>9.2f}{p50:>9.3f}{p95:>9.3f}{recall:>12.3f}")
+
+    print("\n💡 Tune IVF_NPROBE / HNSW_EF_SEARCH in enhanced_vector_index.py for the recall you need")
+    quantization_report(corpus, queries, args.k, truth)
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,27 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import mysql.connector
 import datetime
 import os
 from enhanced_query_agent import QueryAgent
+from enhanced_column_stats import ColumnStatsCatalog
+from enhanced_embedding import fetch_versions, get_shared_embedder
+from enhanced_value_index import get_shared_value_index
+from enhanced_db_pool import DB_CONFIG, get_connection
+from enhanced_result_store import ResultStore, RESULTS_IN_MEMORY, purge_stale_sessions
 from utils.utils_auth import check_user_role
 
 # --- CONFIG ---
 DATA_DICT_PATH = 'data/data_dictionary.xlsx'
 ROLE_ACCESS_PATH = 'data/role_access.xlsx'
+RESULTS_PAGE_SIZE = 100  # rows per page in the results viewer
 
 # --- Database connection utility ---
 def get_db_connection():
-    # Use fixed MySQL credentials
-    mysql_params = {
-        "host": "localhost",
-        "user": "root",
-        "password": "password",
-        "database": "bankexchange"
-    }
+    # Borrowed from the process-wide pool (fixed MySQL credentials in DB_CONFIG); close() returns it
     if not st.session_state.get('mysql_connected', False):
         raise Exception("Not connected to MySQL. Please login to establish connection.")
-    return mysql.connector.connect(
-        host=mysql_params["host"],
-        user=mysql_params["user"],
-        password=mysql_params["password"],
-        database=mysql_params["database"]
-    )
+    return get_connection(DB_CONFIG, role=st.session_state.get('role'))
 
 # --- UTILS ---
 def load_data_dictionary():
@@ -99,9 +93,9 @@ def get_table_list():
     return tables
 
 def get_table_columns():
+    tables = get_table_list()
     conn = get_db_connection()
     cursor = conn.cursor()
-    tables = get_table_list()
     table_cols = {}
     for table in tables:
         columns = []
@@ -154,6 +148,7 @@ def init_session_state():
         "table_cols": None,
         "query_agent": None,
         "metrics": {},
+        "result_store": None,
         "current_query": "",
         "mysql_connected": False
     }
@@ -419,17 +414,54 @@ st.markdown(toggle_btn, unsafe_allow_html=True)
 init_session_state()
 
 # --- SYSTEM INIT ---
+@st.cache_resource(max_entries=1, show_spinner="Loading schema catalog...")
+def load_shared_catalog(schema_version):
+    """Data dictionary, role access and table columns, loaded once and shared read-only by every
+    session until schema_version changes"""
+    return load_data_dictionary(), load_role_access(), get_table_columns()
+
+@st.cache_resource(max_entries=1)
+def load_shared_column_stats(data_version):
+    """Column statistics catalog, loaded once per data version and shared by all sessions"""
+    return ColumnStatsCatalog.load(DB_CONFIG)
+
 def initialize_system_state():
-    st.session_state.data_dict = load_data_dictionary()
-    st.session_state.role_access = load_role_access()
-    st.session_state.table_cols = get_table_columns()
-    agent_db = {
-        "host": "localhost",
-        "user": "root",
-        "password": "password",
-        "database": "bankexchange"
-    }
-    st.session_state.query_agent = QueryAgent('MySQL', agent_db, st.session_state.data_dict, st.session_state.role_access)
+    try:
+        schema_version, data_version = fetch_versions(DB_CONFIG)
+    except Exception as e:
+        print(f"Could not read schema/data version: {e}")
+        schema_version, data_version = None, None
+    if schema_version is not None:
+        data_dict, role_access, table_cols = load_shared_catalog(schema_version)
+        if data_dict.empty or role_access.empty:
+            # Don't pin a failed load for every session
+            load_shared_catalog.clear()
+    else:
+        data_dict, role_access, table_cols = load_data_dictionary(), load_role_access(), get_table_columns()
+    st.session_state.data_dict = data_dict
+    st.session_state.role_access = role_access
+    st.session_state.table_cols = table_cols
+    # The embedder (model + schema/data-row embeddings) is built once per process and only
+    # rebuilt when the schema or data version changes; it warms up in the background
+    embedder = get_shared_embedder(data_dict, version=(schema_version, data_version) if schema_version else None)
+    # Categorical column values for literal grounding, refreshed in the background when data changes
+    value_index = get_shared_value_index(version=data_version, db_info=DB_CONFIG)
+    # Column statistics catalog, reloaded when the data version changes (e.g. after a collector run)
+    column_stats = load_shared_column_stats(data_version) if data_version else ColumnStatsCatalog.load(DB_CONFIG)
+    st.session_state.column_stats = column_stats
+    st.session_state.query_agent = QueryAgent(
+        'MySQL', DB_CONFIG, st.session_state.data_dict, st.session_state.role_access, embedder=embedder,
+        value_index=value_index, column_stats=column_stats
+    )
+    # Embed the data-row partitions this role sees with hidden columns removed before its first question
+    role = st.session_state.get('role')
+    allowed_tables = get_allowed_tables(role, role_access)
+    embedder.prepare_partitions(
+        allowed_tables, {t: get_allowed_columns(role, t, role_access, table_cols) for t in allowed_tables}
+    )
+    # Chat results live in a per-session store that spills older DataFrames to disk
+    purge_stale_sessions()
+    st.session_state.result_store = ResultStore()
     st.session_state.system_ready = True
 
 if 'system_ready' not in st.session_state:
@@ -452,12 +484,7 @@ if not st.session_state.authenticated:
                 st.session_state.role = role
                 # --- Establish MySQL connection here ---
                 try:
-                    conn = mysql.connector.connect(
-                        host="localhost",
-                        user="root",
-                        password="password",
-                        database="bankexchange"
-                    )
+                    conn = get_connection(DB_CONFIG, role=role)
                     conn.close()
                     st.session_state['mysql_connected'] = True
                     # --- Initialize QueryAgent and system state here ---
@@ -485,6 +512,19 @@ with st.sidebar:
     else:
         st.warning("MySQL Status: Not Connected")
 
+    # --- Semantic search warm-up status ---
+    if st.session_state.get('query_agent') is not None:
+        embedder_status = st.session_state.query_agent.embedder.readiness()
+        if embedder_status['ready']:
+            st.info("Semantic Search: Ready")
+        elif embedder_status['state'] in ('lexical', 'failed'):
+            st.warning(f"Semantic Search: {embedder_status['message']}")
+        else:
+            st.progress(embedder_status['progress'], text=f"Semantic search warming up: {embedder_status['message']}")
+            st.caption("Questions are answered with keyword search until it is ready.")
+            if st.button("Refresh Status"):
+                st.rerun()
+
     # --- Remove metrics and allowed tables sections ---
     # --- Sample Queries ---
     st.subheader("💡 Sample Queries")
@@ -515,9 +555,13 @@ with st.sidebar:
 
     if st.button("Clear History"):
         st.session_state.history = []
+        if st.session_state.result_store is not None:
+            st.session_state.result_store.clear()
         st.rerun()
         
     if st.button("Logout"):
+        if st.session_state.result_store is not None:
+            st.session_state.result_store.clear()
         for key in list(st.session_state.keys()):
             del st.session_state[key]
         st.rerun()
@@ -575,7 +619,52 @@ else:
 if st.session_state.get('mysql_connected', False) and st.session_state.get('query_agent', None) is not None:
     st.title("How can DWH team help you today?")
 
+# --- RESULTS VIEWER ---
+def render_results(i, df):
+    total_rows = df.attrs.get('total_rows', len(df))
+    if df.attrs.get('truncated'):
+        total_str = total_rows if total_rows is not None else f"more than {len(df)}"
+        st.caption(f"Showing the first {len(df)} of {total_str} rows.")
+    n_pages = (len(df) - 1) // RESULTS_PAGE_SIZE + 1
+    page = 1
+    if n_pages > 1:
+        page = st.number_input(f"Page (1-{n_pages})", min_value=1, max_value=n_pages, value=1, step=1, key=f"page_{i}")
+    start = (page - 1) * RESULTS_PAGE_SIZE
+    st.dataframe(df.iloc[start:start + RESULTS_PAGE_SIZE], use_container_width=True)
+
+    # --- Download and Charting options ---
+    col1, col2 = st.columns(2)
+    with col1:
+        csv = df.to_csv(index=False).encode('utf-8')
+        st.download_button("Download CSV", csv, f"query_results_{i}.csv", "text/csv", key=f"csv_{i}")
+    with col2:
+        if len(df.columns) > 1:
+            try:
+                # Simple chart builder
+                st.write("📈 **Create a quick chart**")
+                numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
+                all_cols = df.columns.tolist()
+                if len(numeric_cols) >= 1:
+                    x_axis = st.selectbox("X-Axis", all_cols, key=f"x_axis_{i}")
+                    y_axis = st.selectbox("Y-Axis", numeric_cols, key=f"y_axis_{i}")
+                    chart_type = st.selectbox("Chart Type", ["Bar", "Line", "Pie"], key=f"chart_type_{i}")
+                    if chart_type == "Bar":
+                        fig = px.bar(df, x=x_axis, y=y_axis)
+                        st.plotly_chart(fig, use_container_width=True)
+                    elif chart_type == "Line":
+                        fig = px.line(df, x=x_axis, y=y_axis)
+                        st.plotly_chart(fig, use_container_width=True)
+                    elif chart_type == "Pie":
+                        pie_labels = st.selectbox("Pie Labels (Category)", all_cols, key=f"pie_labels_{i}")
+                        pie_values = st.selectbox("Pie Values (Numeric)", numeric_cols, key=f"pie_values_{i}")
+                        fig = px.pie(df, names=pie_labels, values=pie_values)
+                        st.plotly_chart(fig, use_container_width=True)
+            except Exception as e:
+                st.warning(f"Could not generate chart: {e}")
+
+
 # --- CHAT HISTORY ---
+recent_result_ids = [m["result_id"] for m in st.session_state.history if m.get("result_id")][-RESULTS_IN_MEMORY:]
 for i, message in enumerate(st.session_state.history):
     is_user = message["role"] == "user"
     avatar_content = st.session_state.username[0].upper() if is_user else "🤖"
@@ -595,41 +684,25 @@ for i, message in enumerate(st.session_state.history):
         </div>
         """, unsafe_allow_html=True)
         
-        # Display SQL query and results in expanders, ChatGPT-style
-        if "results" in message and message["results"] is not None and not message["results"].empty:
-            with st.expander("📊 View Results", expanded=True):
-                df = message["results"]
-                st.dataframe(df, use_container_width=True)
-                
-                # --- Download and Charting options ---
-                col1, col2 = st.columns(2)
-                with col1:
-                    csv = df.to_csv(index=False).encode('utf-8')
-                    st.download_button("Download CSV", csv, f"query_results_{i}.csv", "text/csv", key=f"csv_{i}")
-                with col2:
-                    if len(df.columns) > 1:
-                        try:
-                            # Simple chart builder
-                            st.write("📈 **Create a quick chart**")
-                            numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
-                            all_cols = df.columns.tolist()
-                            if len(numeric_cols) >= 1:
-                                x_axis = st.selectbox("X-Axis", all_cols, key=f"x_axis_{i}")
-                                y_axis = st.selectbox("Y-Axis", numeric_cols, key=f"y_axis_{i}")
-                                chart_type = st.selectbox("Chart Type", ["Bar", "Line", "Pie"], key=f"chart_type_{i}")
-                                if chart_type == "Bar":
-                                    fig = px.bar(df, x=x_axis, y=y_axis)
-                                    st.plotly_chart(fig, use_container_width=True)
-                                elif chart_type == "Line":
-                                    fig = px.line(df, x=x_axis, y=y_axis)
-                                    st.plotly_chart(fig, use_container_width=True)
-                                elif chart_type == "Pie":
-                                    pie_labels = st.selectbox("Pie Labels (Category)", all_cols, key=f"pie_labels_{i}")
-                                    pie_values = st.selectbox("Pie Values (Numeric)", numeric_cols, key=f"pie_values_{i}")
-                                    fig = px.pie(df, names=pie_labels, values=pie_values)
-                                    st.plotly_chart(fig, use_container_width=True)
-                        except Exception as e:
-                            st.warning(f"Could not generate chart: {e}")
+        # Display results in expanders, ChatGPT-style. Recent results are shown straight away;
+        # older ones were spilled to disk and are only reloaded when the user asks for them.
+        result_id = message.get("result_id")
+        if result_id and st.session_state.result_store is not None:
+            store = st.session_state.result_store
+            if result_id in recent_result_ids:
+                df = store.get(result_id)
+                if df is not None:
+                    with st.expander("📊 View Results", expanded=True):
+                        render_results(i, df)
+            else:
+                meta = store.meta(result_id)
+                with st.expander(f"📊 View Results ({meta.get('rows', 0)} rows)", expanded=False):
+                    if st.checkbox("Load results", key=f"load_{i}"):
+                        df = store.get(result_id)
+                        if df is not None:
+                            render_results(i, df)
+                        else:
+                            st.warning("These results are no longer available.")
 
 
 # --- FIXED CHAT INPUT FORM ---
@@ -675,21 +748,33 @@ with st.form(key="chat_form", clear_on_submit=True):
                     for msg in reversed(st.session_state.history):
                         if msg.get("role") == "assistant" and msg.get("sql_query"):
                             previous_query = msg["sql_query"]
-                            if msg.get("results") is not None and not msg["results"].empty:
-                                previous_result_columns = list(msg["results"].columns)
+                            if msg.get("result_columns"):
+                                previous_result_columns = list(msg["result_columns"])
                             break
                 
+                # Show the first page as soon as it is fetched while the rest streams in
+                preview = st.empty()
+                def show_first_page(page_df, rows_fetched):
+                    if rows_fetched == len(page_df):
+                        preview.dataframe(page_df.head(RESULTS_PAGE_SIZE), use_container_width=True)
                 sql_query, response, df = st.session_state.query_agent.answer_query(
                     query_input, allowed_tables, allowed_columns,
-                    previous_query=previous_query, previous_result_columns=previous_result_columns
+                    previous_query=previous_query, previous_result_columns=previous_result_columns,
+                    role=st.session_state.role, on_page=show_first_page
                 )
+                preview.empty()
                 
+                result_id = None
+                if df is not None and not df.empty:
+                    result_id = st.session_state.result_store.put(df)
                 st.session_state.history.append({
                     "role": "assistant",
                     "content": response,
                     "sql_query": sql_query,
-                    "results": df
+                    "result_id": result_id,
+                    "result_columns": list(df.columns) if result_id else None
                 })
+                st.session_state.metrics.update(st.session_state.query_agent.get_metrics())
                 # --- LOG USER PROMPT AND GENERATED SQL TO FILE ---
                 try:
                     log_dir = "logs"
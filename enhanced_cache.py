@@ -0,0 +1,406 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from sqlparse import lexer
+from sqlparse import tokens as T
+
+# --- SEMANTIC SQL CACHE CONFIG ---
+SQL_CACHE_MAX_ENTRIES = 512
+# Cosine similarity between question embeddings needed to reuse a cached query
+SQL_CACHE_SIMILARITY_THRESHOLD = 0.9
+# Words that don't change what a question asks for. Every other word (names, values, numbers and
+# negations such as 'without') must also match before a similar cached question is reused
+SQL_CACHE_STOPWORDS = {
+    'a', 'an', 'the', 'all', 'any', 'me', 'my', 'us', 'our', 'i', 'we', 'you', 'please', 'can', 'could',
+    'would', 'show', 'list', 'display', 'give', 'get', 'find', 'fetch', 'return', 'tell', 'see', 'view',
+    'what', 'which', 'who', 'whose', 'is', 'are', 'was', 'were', 'be', 'do', 'does', 'there', 'that',
+    'this', 'these', 'those', 'of', 'for', 'in', 'on', 'at', 'by', 'to', 'from', 'with', 'and', 'details',
+    'detail', 'info', 'information', 'record', 'records', 'data',
+}
+
+# --- RESULT-SET CACHE CONFIG ---
+RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+RESULT_CACHE_DEFAULT_TTL = 300  # seconds
+# Per-table TTL overrides in seconds, e.g. {'txn_hist': 30}; a query uses the shortest TTL of its tables
+RESULT_CACHE_TABLE_TTLS = {}
+# How long a table's (UPDATE_TIME, row count) snapshot is trusted before it is re-read from MySQL
+RESULT_CACHE_VERSION_CHECK_INTERVAL = 5  # seconds
+
+def policy_fingerprint(role, allowed_tables, allowed_columns):
+    """Stable hash of a role and its allowed tables/columns, so cached SQL never crosses access policies"""
+    columns = {}
+    for table, cols in (allowed_columns or {}).items():
+        columns[table] = cols if isinstance(cols, str) else sorted(cols)
+    payload = json.dumps(
+        {'role': role, 'tables': sorted(allowed_tables or []), 'columns': columns},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def allowed_column_set(table, allowed_columns):
+    """Lower-cased column names a role may see in table, or None when it may see every column"""
+    if allowed_columns is None:
+        return None
+    cols = allowed_columns.get(table)
+    if isinstance(cols, str):
+        if cols.strip().upper() == 'ALL':
+            return None
+        cols = cols.split(',')
+    return {str(c).strip().lower() for c in (cols or []) if str(c).strip()}
+
+def frame_fingerprint(*frames):
+    """Hash the content of the data dictionary / role access frames to detect when they change"""
+    h = hashlib.sha1()
+    for df in frames:
+        if isinstance(df, pd.DataFrame):
+            h.update(df.to_csv().encode('utf-8'))
+        else:
+            h.update(repr(df).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+def normalize_question(question):
+    return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', ' ', question.lower())).strip()
+
+def _question_terms(question):
+    # Content words must match exactly: "balance over 50000" / "balance over 10000", "customers in
+    # Mumbai" / "customers in Pune" and "accounts with loans" / "accounts without loans" embed almost
+    # identically but need different SQL. Plurals are folded so "customer" matches "customers"
+    terms = set()
+    for word in normalize_question(question).split():
+        if word in SQL_CACHE_STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        terms.add(word)
+    return frozenset(terms)
+
+def _unit_vector(q_emb):
+    if q_emb is None:
+        return None
+    if hasattr(q_emb, 'detach'):
+        q_emb = q_emb.detach().cpu().numpy()
+    vec = np.asarray(q_emb, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else None
+
+class SemanticSQLCache:
+    """LRU cache of validated SQL keyed on question embedding similarity and access policy.
+
+    Entries are only reused for the same schema version (data dictionary / role access fingerprint)
+    and policy fingerprint (role + allowed tables/columns), so sessions on different versions share
+    the cache without clearing each other's entries; entries of old versions age out of the LRU.
+    A similar question is only a hit when its content words match too (see _question_terms)."""
+
+    def __init__(self, max_entries=SQL_CACHE_MAX_ENTRIES, similarity_threshold=SQL_CACHE_SIMILARITY_THRESHOLD):
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def lookup(self, question, q_emb, policy_key, version):
+        """Return (sql, message) of the most similar cached question for this version and policy, or None"""
+        vec = _unit_vector(q_emb)
+        norm_q = normalize_question(question)
+        terms = _question_terms(question)
+        with self._lock:
+            best_key, best_score = None, None
+            for key, entry in self._entries.items():
+                if entry['version'] != version or entry['policy'] != policy_key or entry['terms'] != terms:
+                    continue
+                if entry['question'] == norm_q:
+                    score = 1.0
+                elif vec is not None and entry['vector'] is not None and entry['vector'].shape == vec.shape:
+                    score = float(np.dot(vec, entry['vector']))
+                else:
+                    continue
+                if score >= self.similarity_threshold and (best_score is None or score > best_score):
+                    best_key, best_score = key, score
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            entry = self._entries[best_key]
+            return entry['sql'], entry['message']
+
+    def store(self, question, q_emb, policy_key, version, sql, message):
+        norm_q = normalize_question(question)
+        key = (version, policy_key, norm_q)
+        with self._lock:
+            self._entries[key] = {
+                'version': version,
+                'policy': policy_key,
+                'question': norm_q,
+                'terms': _question_terms(question),
+                'vector': _unit_vector(q_emb),
+                'sql': sql,
+                'message': message,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+            }
+
+_QUOTED_RE = re.compile(r"('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\")")
+# Words that end a FROM / JOIN table list (a table can't be named like this without backticks)
+_CLAUSE_WORDS = {'where', 'on', 'using', 'group', 'order', 'having', 'limit', 'union', 'window', 'for', 'lock',
+                 'select', 'into', 'as', 'inner', 'left', 'right', 'cross', 'natural', 'straight_join', 'join',
+                 'partition', 'use', 'force', 'ignore', 'lateral', 'with', 'values', 'set', 'procedure'}
+# Functions whose arguments use FROM without naming a table, e.g. EXTRACT(YEAR FROM opened_on)
+_FROM_FUNCTIONS = {'extract', 'trim', 'substring', 'substr', 'position', 'overlay'}
+
+def normalize_sql(sql_query):
+    """Lower-case keywords and function names, collapse whitespace outside string literals and drop
+    the trailing semicolon, so queries differing only in keyword case or layout share a cache entry"""
+    tokens = list(lexer.tokenize(sql_query.strip()))
+    parts = []
+    for i, (ttype, value) in enumerate(tokens):
+        if ttype in T.Whitespace:
+            if parts and parts[-1] == ' ':
+                continue
+            value = ' '
+        elif ttype in T.Keyword or (ttype in T.Name and i + 1 < len(tokens) and tokens[i + 1][1] == '('):
+            value = re.sub(r'\s+', ' ', value.lower())
+        parts.append(value)
+    return ''.join(parts).strip().rstrip(';').strip()
+
+def _identifier(value):
+    return value[1:-1].replace('``', '`') if value.startswith('`') else value
+
+def _closing_paren(words, i):
+    """Index of the ')' matching the '(' at words[i] (len(words) if unbalanced)"""
+    depth = 0
+    for j in range(i, len(words)):
+        if words[j] == '(':
+            depth += 1
+        elif words[j] == ')':
+            depth -= 1
+            if depth == 0:
+                return j
+    return len(words)
+
+def _scan_tables(tokens, words, start, end, tables, ctes):
+    """Add the tables read by tokens[start:end] to tables; False when one can't be determined"""
+    i = start
+    calls = []  # word before each open '(' (to spot EXTRACT(... FROM ...) and the like)
+    while i < end:
+        word = words[i]
+        if word == '(':
+            calls.append(words[i - 1] if i > start else '')
+        elif word == ')':
+            if calls:
+                calls.pop()
+        elif word == 'with' and i + 1 < end:
+            # CTE names are not tables: WITH [RECURSIVE] name [(columns)] AS (...), ...
+            j = i + 1 + (words[i + 1] == 'recursive')
+            while j < end:
+                ctes.add(_identifier(tokens[j][1]).lower())
+                j += 1
+                if j < end and words[j] == '(':
+                    j = _closing_paren(words, j) + 1
+                if j + 1 >= end or words[j] != 'as' or words[j + 1] != '(':
+                    break
+                close = _closing_paren(words, j + 1)
+                if not _scan_tables(tokens, words, j + 2, close, tables, ctes):
+                    return False
+                j = close + 1
+                if j >= end or words[j] != ',':
+                    break
+                j += 1
+            i = j
+            continue
+        elif (word == 'from' or word.endswith('join')) and not (calls and calls[-1] in _FROM_FUNCTIONS):
+            # Table list: [db.]table [[AS] alias] or (subquery) [AS] alias, separated by commas
+            i += 1
+            while i < end:
+                ttype, value = tokens[i]
+                if words[i] == '(':
+                    close = _closing_paren(words, i)
+                    if not _scan_tables(tokens, words, i + 1, close, tables, ctes):
+                        return False
+                    i = close + 1
+                elif ttype in T.Name or (ttype in T.Keyword and words[i].split()[0] not in _CLAUSE_WORDS):
+                    parts = [_identifier(value)]
+                    i += 1
+                    while i + 1 < end and words[i] == '.':
+                        parts.append(_identifier(tokens[i + 1][1]))
+                        i += 2
+                    if i < end and words[i] == '(':
+                        return False  # table function, e.g. JSON_TABLE(...)
+                    name = '.'.join(parts).lower()
+                    if name != 'dual' and name not in ctes:
+                        tables.add(name)
+                else:
+                    return False
+                if i < end and words[i] == 'as':
+                    i += 2
+                elif i < end and tokens[i][0] in T.Name:
+                    i += 1
+                if i < end and words[i] == ',':
+                    i += 1
+                    continue
+                break
+            continue
+        i += 1
+    return True
+
+def sql_tables(sql_query):
+    """Lower-cased tables a query reads, 'db.table' when qualified (used for TTLs and invalidation).
+    Handles comma-separated lists, joins, subqueries, derived tables and CTEs; returns None when a
+    source can't be determined (e.g. a table function), so the result is not cached."""
+    tokens = [(ttype, value) for ttype, value in lexer.tokenize(sql_query)
+              if ttype not in T.Whitespace and ttype not in T.Comment]
+    words = [re.sub(r'\s+', ' ', value.lower()) for _, value in tokens]
+    tables = set()
+    if not _scan_tables(tokens, words, 0, len(tokens), tables, set()):
+        return None
+    return sorted(tables)
+
+class ResultCache:
+    """Size-bounded LRU cache of query result DataFrames.
+
+    Keyed on normalized SQL plus the role's column-policy fingerprint. Entries expire after the
+    shortest TTL of the tables they read, and are dropped as soon as any of those tables reports a
+    different (UPDATE_TIME, row count). `version_loader(tables)` must return {table: version} for the
+    lower-cased names of sql_tables(); results of queries with a table that has no version (or
+    whose tables can't be determined) are never cached."""
+
+    def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES, default_ttl=RESULT_CACHE_DEFAULT_TTL,
+                 table_ttls=None, version_check_interval=RESULT_CACHE_VERSION_CHECK_INTERVAL):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.table_ttls = dict(RESULT_CACHE_TABLE_TTLS if table_ttls is None else table_ttls)
+        self.version_check_interval = version_check_interval
+        self._entries = OrderedDict()
+        self._table_versions = {}  # table -> (version, checked_at)
+        self._lock = threading.Lock()
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def ttl_for(self, tables):
+        ttls = {str(t).lower(): ttl for t, ttl in self.table_ttls.items()}
+        return min([ttls.get(t, self.default_ttl) for t in tables] or [self.default_ttl])
+
+    def _versions(self, tables, version_loader):
+        now = time.monotonic()
+        with self._lock:
+            stale = [t for t in tables
+                     if t not in self._table_versions or now - self._table_versions[t][1] > self.version_check_interval]
+        if stale:
+            fresh = {str(t).lower(): v for t, v in version_loader(stale).items()}
+            with self._lock:
+                for t in stale:
+                    self._table_versions[t] = (fresh.get(t), now)
+        with self._lock:
+            return {t: self._table_versions[t][0] for t in tables}
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self.bytes_used -= entry['nbytes']
+
+    def get(self, sql_query, policy_key, version_loader):
+        key = (normalize_sql(sql_query), policy_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() >= entry['expires_at']:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+        try:
+            versions = self._versions(entry['tables'], version_loader)
+        except Exception as e:
+            print(f"Result cache version check failed: {e}")
+            versions = None
+        with self._lock:
+            if versions != entry['versions'] or None in versions.values():
+                if key in self._entries:
+                    self._drop(key)
+                    self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry['df']
+
+    def put(self, sql_query, policy_key, df, version_loader):
+        tables = sql_tables(sql_query)
+        if not tables or df is None:
+            return
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        try:
+            versions = self._versions(tables, version_loader)
+        except Exception as e:
+            print(f"Result cache version check failed: {e}")
+            return
+        if None in versions.values():
+            # A table MySQL didn't report (e.g. a view or another schema's table): no way to invalidate it
+            return
+        key = (normalize_sql(sql_query), policy_key)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = {
+                'df': df,
+                'tables': tables,
+                'versions': versions,
+                'expires_at': time.monotonic() + self.ttl_for(tables),
+                'nbytes': nbytes,
+            }
+            self.bytes_used += nbytes
+            while self.bytes_used > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._table_versions.clear()
+            self.bytes_used = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes_used,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+# Process-wide caches shared by every QueryAgent (and therefore every Streamlit session)
+SQL_CACHE = SemanticSQLCache()
+RESULT_CACHE = ResultCache()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Column statistics catalog: row counts, NDV, min/max, null ratio and top values per column
+
+Collected into the MySQL table `column_stats` by running this module (incremental: only tables whose
+information_schema UPDATE_TIME or row count changed since the last run are re-scanned), and loaded
+into memory by the app / QueryAgent as a ColumnStatsCatalog.
+
+Usage:
+    python enhanced_column_stats.py           # refresh changed tables
+    python enhanced_column_stats.py --full    # re-scan every table
+"""
+
+import argparse
+import json
+from datetime import datetime
+import pandas as pd
+from enhanced_db_pool import get_connection
+from enhanced_row_sync import ROW_SYNC_SKIP_TABLES
+
+# --- COLUMN STATISTICS CONFIG ---
+# Listed in ROW_SYNC_SKIP_TABLES: it is metadata, never embedded, value-indexed or in the data version
+COLUMN_STATS_TABLE = 'column_stats'
+# Tables with more (estimated) rows than this are sampled instead of scanned in full: the sample is
+# drawn once into a temporary table and every statistic of the table is computed from it
+COLUMN_STATS_SAMPLE_ROWS = 200000
+COLUMN_STATS_SAMPLE_TABLE = '_column_stats_sample'
+# Most frequent values kept per column, for columns with at most COLUMN_STATS_TOP_VALUES_MAX_NDV values
+COLUMN_STATS_TOP_K = 5
+COLUMN_STATS_TOP_VALUES_MAX_NDV = 1000
+COLUMN_STATS_VALUE_LEN = 255
+# Column types with no meaningful distinct count / min / max (only nulls are counted)
+COLUMN_STATS_OPAQUE_TYPES = {'tinytext', 'text', 'mediumtext', 'longtext', 'blob', 'tinyblob', 'mediumblob',
+                             'longblob', 'json', 'geometry', 'binary', 'varbinary'}
+# Session variables of the collector's connection: full scans may run far past the user-query timeout
+COLUMN_STATS_SESSION_SETTINGS = {'max_execution_time': 0}
+
+CREATE_COLUMN_STATS_SQL = f"""
+CREATE TABLE IF NOT EXISTS `{COLUMN_STATS_TABLE}` (
+    table_name VARCHAR(64) NOT NULL,
+    column_name VARCHAR(64) NOT NULL,
+    data_type VARCHAR(64),
+    row_count BIGINT,
+    ndv BIGINT,
+    null_ratio DOUBLE,
+    min_value VARCHAR({COLUMN_STATS_VALUE_LEN}),
+    max_value VARCHAR({COLUMN_STATS_VALUE_LEN}),
+    top_values TEXT,
+    sampled TINYINT(1) NOT NULL DEFAULT 0,
+    table_version VARCHAR(64),
+    collected_at DATETIME,
+    PRIMARY KEY (table_name, column_name)
+)
+"""
+
+def _short(value):
+    if value is None:
+        return None
+    return str(value)[:COLUMN_STATS_VALUE_LEN]
+
+def _scan_table(conn, table, est_rows):
+    """Stats rows for one table: one aggregate pass over all columns, plus a GROUP BY per
+    low-cardinality column for its top values. A sampled table is read once into a temporary
+    table, so every column's statistics and the row count come from the same sample."""
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT COLUMN_NAME, DATA_TYPE FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION", (table,)
+    )
+    columns = cursor.fetchall()
+    sampled = bool(est_rows) and est_rows > COLUMN_STATS_SAMPLE_ROWS
+    if not sampled:
+        return _table_stats(cursor, table, f"`{table}`", columns, None)
+    # Bernoulli sample: one pass over the table, nothing sorted or sent to the client
+    fraction = COLUMN_STATS_SAMPLE_ROWS / est_rows
+    cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS `{COLUMN_STATS_SAMPLE_TABLE}`")
+    cursor.execute(
+        f"CREATE TEMPORARY TABLE `{COLUMN_STATS_SAMPLE_TABLE}` AS "
+        f"SELECT * FROM `{table}` WHERE RAND() < {fraction:.6f}"
+    )
+    try:
+        return _table_stats(cursor, table, f"`{COLUMN_STATS_SAMPLE_TABLE}`", columns, fraction)
+    finally:
+        cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS `{COLUMN_STATS_SAMPLE_TABLE}`")
+
+def _table_stats(cursor, table, source, columns, fraction):
+    """Stats rows computed from source, the table itself or a sample of it drawn with the given
+    fraction (None = the whole table); a sample's row count is scaled back up, its NDV and top
+    values are those of the sample"""
+    sampled = fraction is not None
+    select = ['COUNT(*)']
+    for column, data_type in columns:
+        if data_type.lower() in COLUMN_STATS_OPAQUE_TYPES:
+            select.append(f"SUM(`{column}` IS NULL)")
+        else:
+            select.append(f"COUNT(DISTINCT `{column}`), SUM(`{column}` IS NULL), MIN(`{column}`), MAX(`{column}`)")
+    cursor.execute(f"SELECT {', '.join(select)} FROM {source}")
+    result = list(cursor.fetchone())
+    scanned = int(result.pop(0) or 0)
+    row_count = int(round(scanned / fraction)) if sampled else scanned
+    rows = []
+    for column, data_type in columns:
+        nulls = None
+        stats = {'table_name': table, 'column_name': column, 'data_type': data_type, 'sampled': int(sampled),
+                 'row_count': row_count, 'ndv': None, 'min_value': None, 'max_value': None, 'top_values': None}
+        if data_type.lower() in COLUMN_STATS_OPAQUE_TYPES:
+            nulls = result.pop(0)
+        else:
+            ndv, nulls, min_value, max_value = result[:4]
+            del result[:4]
+            stats.update(ndv=int(ndv or 0), min_value=_short(min_value), max_value=_short(max_value))
+        stats['null_ratio'] = float(nulls or 0) / scanned if scanned else 0.0
+        if stats['ndv'] and stats['ndv'] <= COLUMN_STATS_TOP_VALUES_MAX_NDV:
+            cursor.execute(
+                f"SELECT `{column}`, COUNT(*) AS n FROM {source} WHERE `{column}` IS NOT NULL "
+                f"GROUP BY `{column}` ORDER BY n DESC LIMIT {COLUMN_STATS_TOP_K}"
+            )
+            stats['top_values'] = json.dumps([[_short(v), int(n)] for v, n in cursor.fetchall()])
+        rows.append(stats)
+    return rows
+
+def collect_column_stats(db_info=None, full=False):
+    """Refresh the column_stats catalog table; returns counts of scanned / skipped tables"""
+    stats = {'tables': 0, 'scanned': 0, 'skipped': 0, 'columns': 0}
+    conn = get_connection(db_info, settings=COLUMN_STATS_SESSION_SETTINGS)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(CREATE_COLUMN_STATS_SQL)
+        cursor.execute(
+            "SELECT TABLE_NAME, UPDATE_TIME, TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE' ORDER BY TABLE_NAME"
+        )
+        versions = {name: (str(update_time), rows) for name, update_time, rows in cursor.fetchall()
+                    if name not in ROW_SYNC_SKIP_TABLES}
+        cursor.execute(f"SELECT DISTINCT table_name, table_version FROM `{COLUMN_STATS_TABLE}`")
+        collected = dict(cursor.fetchall())
+        for table in [t for t in collected if t not in versions]:
+            cursor.execute(f"DELETE FROM `{COLUMN_STATS_TABLE}` WHERE table_name = %s", (table,))
+        for table, (update_time, est_rows) in versions.items():
+            stats['tables'] += 1
+            version = f"{update_time}|{est_rows}"
+            # UPDATE_TIME is NULL for InnoDB tables untouched since server start: can't trust it then
+            if not full and update_time != 'None' and collected.get(table) == version:
+                stats['skipped'] += 1
+                continue
+            rows = _scan_table(conn, table, est_rows)
+            now = datetime.now()
+            # Replace the table's rows atomically so readers never see it half-written
+            cursor.execute("START TRANSACTION")
+            try:
+                cursor.execute(f"DELETE FROM `{COLUMN_STATS_TABLE}` WHERE table_name = %s", (table,))
+                cursor.executemany(
+                    f"INSERT INTO `{COLUMN_STATS_TABLE}` (table_name, column_name, data_type, row_count, ndv, null_ratio, "
+                    "min_value, max_value, top_values, sampled, table_version, collected_at) "
+                    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                    [(r['table_name'], r['column_name'], r['data_type'], r['row_count'], r['ndv'], r['null_ratio'],
+                      r['min_value'], r['max_value'], r['top_values'], r['sampled'], version, now) for r in rows]
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            stats['scanned'] += 1
+            stats['columns'] += len(rows)
+    finally:
+        conn.close()
+    print(f"Column stats: {stats}")
+    return stats
+
+class ColumnStatsCatalog:
+    """In-memory view of the column_stats table (lookups are case-insensitive)"""
+
+    def __init__(self, frame=None):
+        self.frame = frame if frame is not None else pd.DataFrame()
+        self._columns = {}
+        self._tables = {}
+        for row in self.frame.to_dict('records'):
+            # NULL numbers come back from read_sql as NaN
+            row = {k: (None if isinstance(v, float) and v != v else v) for k, v in row.items()}
+            for key in ('row_count', 'ndv', 'sampled'):
+                if row.get(key) is not None:
+                    row[key] = int(row[key])
+            row['top_values'] = json.loads(row['top_values']) if row.get('top_values') else []
+            table, column = str(row['table_name']).lower(), str(row['column_name']).lower()
+            self._columns[(table, column)] = row
+            self._tables[table] = row['row_count']
+
+    @classmethod
+    def load(cls, db_info=None):
+        """Load the catalog from MySQL (empty if the collector has never run)"""
+        conn = get_connection(db_info)
+        try:
+            frame = pd.read_sql(f"SELECT * FROM `{COLUMN_STATS_TABLE}`", conn)
+        except Exception as e:
+            print(f"Column stats not available ({e}); run python enhanced_column_stats.py")
+            frame = pd.DataFrame()
+        finally:
+            conn.close()
+        return cls(frame)
+
+    def __bool__(self):
+        return bool(self._columns)
+
+    def row_count(self, table):
+        return self._tables.get(str(table).lower())
+
+    def column(self, table, column):
+        """Stats dict of one column (None if unknown)"""
+        return self._columns.get((str(table).lower(), str(column).lower()))
+
+    def describe(self, table, column):
+        """Short hint for prompts, e.g. '3 distinct (Savings, Current, ...); 2% null'"""
+        stats = self.column(table, column)
+        if stats is None:
+            return ''
+        parts = []
+        if stats['ndv'] is not None:
+            if stats['top_values'] and stats['ndv'] <= COLUMN_STATS_TOP_K:
+                parts.append(f"{stats['ndv']} distinct ({', '.join(str(v) for v, _ in stats['top_values'])})")
+            else:
+                parts.append(f"{stats['ndv']} distinct")
+                if stats['min_value'] is not None:
+                    parts.append(f"range {stats['min_value']} .. {stats['max_value']}")
+        if stats['null_ratio']:
+            parts.append(f"{stats['null_ratio']:.0%} null")
+        return '; '.join(parts)
+
+    def stats(self):
+        return {'tables': len(self._tables), 'columns': len(self._columns)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--full', action='store_true', help='re-scan every table, not only changed ones')
+    collect_column_stats(full=parser.parse_args().full)
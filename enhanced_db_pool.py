@@ -0,0 +1,206 @@
+import queue
+import re
+import threading
+import time
+import mysql.connector
+
+# --- CONNECTION POOL CONFIG ---
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",
+    "password": "password",
+    "database": "bankexchange"
+}
+POOL_SIZE = 8
+POOL_CHECKOUT_TIMEOUT = 10  # seconds to wait for a free connection before giving up
+# Session variables applied on checkout. Checkouts for a role (the app's user queries) get
+# DEFAULT_SESSION_SETTINGS, overridden per role by ROLE_SESSION_SETTINGS entries,
+# e.g. {'Customer Service': {'max_execution_time': 5000}}; checkouts without a role (loaders, syncs,
+# catalog jobs) get BACKGROUND_SESSION_SETTINGS. get_connection(settings=...) overrides both.
+DEFAULT_SESSION_SETTINGS = {'max_execution_time': 30000}  # milliseconds, SELECT statements only
+ROLE_SESSION_SETTINGS = {}
+BACKGROUND_SESSION_SETTINGS = {'max_execution_time': 0}  # 0 = no limit
+
+class PooledConnection:
+    """Thin proxy over a pooled mysql connection: close() hands it back to the pool instead of closing it"""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def close(self):
+        if self._conn is not None:
+            self._pool._release(self._conn)
+            self._conn = None
+
+    def discard(self):
+        """Close the underlying connection instead of returning it, e.g. after abandoning a streamed result"""
+        if self._conn is not None:
+            self._pool._discard(self._conn)
+            self._conn = None
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise mysql.connector.errors.InterfaceError("Connection already returned to pool")
+        return getattr(self._conn, name)
+
+    def __del__(self):
+        # Safety net for callers that drop a connection on an exception path without closing it
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class ConnectionPool:
+    """Fixed-size, lazily filled pool of MySQL connections with health checks and per-role session settings"""
+
+    def __init__(self, db_info, size=POOL_SIZE, checkout_timeout=POOL_CHECKOUT_TIMEOUT):
+        self.db_info = dict(db_info)
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._session_settings = {}  # id(raw connection) -> session variables applied to it
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_last = 0.0
+        self.health_check_failures = 0
+
+    def _connect(self):
+        conn = mysql.connector.connect(**self.db_info)
+        # Autocommit so a reused connection never reads from a stale REPEATABLE READ snapshot
+        conn.autocommit = True
+        return conn
+
+    def _discard(self, conn):
+        self._session_settings.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    def get_connection(self, role=None, settings=None):
+        start = time.perf_counter()
+        conn = None
+        while conn is None:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        conn = self._connect()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                    break
+                remaining = self.checkout_timeout - (time.perf_counter() - start)
+                if remaining <= 0:
+                    raise mysql.connector.errors.PoolError(
+                        f"No MySQL connection available within {self.checkout_timeout}s (pool size {self.size})"
+                    )
+                try:
+                    conn = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+            # Health check on checkout: replace connections the server has dropped
+            if not conn.is_connected():
+                self.health_check_failures += 1
+                self._discard(conn)
+                conn = None
+        try:
+            self._apply_session_settings(conn, role, settings)
+        except Exception:
+            self._discard(conn)
+            raise
+        waited = time.perf_counter() - start
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_last = waited
+            self.wait_max = max(self.wait_max, waited)
+        return PooledConnection(self, conn)
+
+    def _apply_session_settings(self, conn, role, overrides=None):
+        if role is None:
+            settings = dict(BACKGROUND_SESSION_SETTINGS)
+        else:
+            settings = dict(DEFAULT_SESSION_SETTINGS)
+            settings.update(ROLE_SESSION_SETTINGS.get(role, {}))
+        settings.update(overrides or {})
+        applied = self._session_settings.get(id(conn))
+        if applied == settings:
+            return
+        cursor = conn.cursor()
+        try:
+            for name in settings.keys() | (applied or {}).keys():
+                if not re.fullmatch(r'\w+', name):
+                    raise ValueError(f"Invalid session variable name: {name}")
+                if name not in settings:
+                    # Set by an earlier borrower only: back to the server default
+                    cursor.execute(f"SET SESSION {name} = DEFAULT")
+                elif applied is None or applied.get(name) != settings[name]:
+                    cursor.execute(f"SET SESSION {name} = %s", (settings[name],))
+        finally:
+            cursor.close()
+        self._session_settings[id(conn)] = settings
+
+    def _release(self, conn):
+        try:
+            # Drop any unread result set and roll back an open transaction so the next borrower starts clean
+            if conn.unread_result:
+                conn.consume_results()
+            if conn.in_transaction:
+                conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+        self._idle.put(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'open': self._created,
+                'idle': self._idle.qsize(),
+                'checkouts': self.checkouts,
+                'wait_avg': self.wait_total / self.checkouts if self.checkouts else 0.0,
+                'wait_max': self.wait_max,
+                'wait_last': self.wait_last,
+                'health_check_failures': self.health_check_failures,
+            }
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+def get_pool(db_info=None):
+    """Process-wide pool for the given connection parameters (DB_CONFIG by default)"""
+    db_info = db_info or DB_CONFIG
+    key = tuple(sorted(db_info.items()))
+    with _POOLS_LOCK:
+        if key not in _POOLS:
+            _POOLS[key] = ConnectionPool(db_info)
+        return _POOLS[key]
+
+def get_connection(db_info=None, role=None, settings=None):
+    """Borrow a connection; call close() (or use it as a context manager) to return it to the pool.
+    role selects the user-query session settings (see DEFAULT_SESSION_SETTINGS); settings overrides
+    session variables for this checkout, e.g. {'max_execution_time': 0} for a long maintenance job."""
+    return get_pool(db_info).get_connection(role=role, settings=settings)
+
+def pool_stats(db_info=None):
+    return get_pool(db_info).stats()
@@ -1,8 +1,22 @@
-from sentence_transformers import SentenceTransformer, util
 import pandas as pd
 import numpy as np
 import os
-import mysql.connector
+import re
+import hashlib
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from enhanced_cache import allowed_column_set
+from enhanced_db_pool import get_connection
+from enhanced_embedding_backend import EMBED_BACKEND, embedding_model_key, load_embedding_model
+from enhanced_embedding_cache import EmbeddingCache
+from enhanced_lexical_index import (
+    HYBRID_CANDIDATES, HYBRID_LEXICAL_WEIGHT, HYBRID_SEARCH, BM25Index, reciprocal_rank_fusion
+)
+from enhanced_row_sync import ROW_SYNC_SKIP_TABLES, format_row_text, get_shared_row_sync
+from enhanced_vector_index import VECTOR_INDEX_BACKEND, VECTOR_QUANTIZATION, ExactIndex, build_index
 
 # Try to use local embedding model, fallback to smaller model that can be cached
 def get_embedding_model():
@@ -18,15 +32,281 @@ def get_embedding_model():
 
 EMBED_MODEL = get_embedding_model()
 
+# --- PROCESS-WIDE SHARED RESOURCES ---
+# The model and the embedder are loaded once per process and shared read-only by every session
+_MODEL_LOCK = threading.Lock()
+_SHARED_MODELS = {}  # (model name, backend) -> SentenceTransformer, or None if it failed to load
+_EMBEDDER_LOCK = threading.Lock()
+_SHARED_EMBEDDER = {'version': None, 'embedder': None}
+
+def get_shared_model(model_name=EMBED_MODEL, backend=EMBED_BACKEND):
+    """Load the embedding model once per process (a failed load is remembered, not retried).
+    backend selects the CPU inference backend (see enhanced_embedding_backend); the one actually
+    used is kept on the model as embed_backend."""
+    key = (model_name, backend)
+    with _MODEL_LOCK:
+        if key not in _SHARED_MODELS:
+            try:
+                model, used = load_embedding_model(model_name, backend)
+                model.embed_backend = used
+                _SHARED_MODELS[key] = model
+                print(f"Using embedding model: {model_name} ({used})")
+            except Exception as e:
+                print(f"Warning: Could not load embedding model {model_name}: {e}")
+                print("Falling back to basic text matching")
+                _SHARED_MODELS[key] = None
+        return _SHARED_MODELS[key]
+
+# Recent question vectors kept per model, so repeat and sample questions skip the forward pass
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+# Concurrent question encodes are coalesced into one forward pass: the worker waits up to
+# EMBED_BATCH_WINDOW_MS after the first request for others (0 = only take what is already queued)
+EMBED_BATCH_MAX_SIZE = 32
+EMBED_BATCH_WINDOW_MS = 5
+# Recent per-request latencies kept for the p50 / p95 figures in stats()
+EMBED_BATCH_LATENCY_SAMPLES = 1000
+
+class EmbeddingBatcher:
+    """Single worker thread that encodes queued texts in micro-batches.
+
+    Callers block on encode(); the worker gathers the requests that arrive within a short window,
+    encodes the distinct texts in one model.encode call and hands each caller its own row."""
+
+    def __init__(self, model, max_batch_size=EMBED_BATCH_MAX_SIZE, window_ms=EMBED_BATCH_WINDOW_MS):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.window = window_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self.batches = 0
+        self.requests = 0
+        self.encoded = 0
+        self.max_batch = 0
+        self.max_queue_depth = 0
+        self._latencies = deque(maxlen=EMBED_BATCH_LATENCY_SAMPLES)
+
+    def encode(self, text):
+        """Return the (1, dim) embedding of text, computed in a batch with concurrent callers"""
+        future = Future()
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+                self._worker.start()
+            self._queue.put((text, future, time.perf_counter()))
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                batch.append(self._queue.get())
+                deadline = time.perf_counter() + self.window
+                while len(batch) < self.max_batch_size:
+                    try:
+                        remaining = deadline - time.perf_counter()
+                        batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                self._encode_batch(batch)
+            except Exception as e:
+                # Fail every caller of the batch that has no result yet, and keep serving later batches
+                print(f"Warning: Embedding batch of {len(batch)} failed: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _encode_batch(self, batch):
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        embeddings = self.model.encode(texts, convert_to_tensor=True)
+        rows = {text: i for i, text in enumerate(texts)}
+        done = time.perf_counter()
+        for text, future, enqueued in batch:
+            row = embeddings[rows[text]:rows[text] + 1]
+            # Copy the row so cached question vectors don't keep the whole batch alive
+            future.set_result(row.clone() if hasattr(row, 'clone') else row.copy())
+        with self._lock:
+            self.batches += 1
+            self.requests += len(batch)
+            self.encoded += len(texts)
+            self.max_batch = max(self.max_batch, len(batch))
+            self._latencies.extend((done - enqueued) * 1000 for _, _, enqueued in batch)
+
+    def stats(self):
+        with self._lock:
+            latencies = np.array(self._latencies) if self._latencies else None
+            return {
+                'batches': self.batches,
+                'requests': self.requests,
+                'encoded': self.encoded,
+                'avg_batch_size': self.requests / self.batches if self.batches else 0.0,
+                'max_batch_size': self.max_batch,
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'latency_ms_p50': float(np.percentile(latencies, 50)) if latencies is not None else 0.0,
+                'latency_ms_p95': float(np.percentile(latencies, 95)) if latencies is not None else 0.0,
+            }
+
+class QueryEncoder:
+    """Encodes each question once and keeps a bounded LRU of recent question vectors.
+    Misses go through an EmbeddingBatcher, so concurrent sessions share forward passes."""
+
+    def __init__(self, model, max_entries=QUERY_EMBEDDING_CACHE_SIZE):
+        self.model = model
+        self.batcher = EmbeddingBatcher(model)
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, question):
+        key = question.strip()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+        q_emb = self.batcher.encode(key)
+        with self._lock:
+            self._cache[key] = q_emb
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return q_emb
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._cache),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'batching': self.batcher.stats(),
+            }
+
+_QUERY_ENCODERS = {}  # (model name, backend) -> QueryEncoder
+
+def get_query_encoder(model_name=EMBED_MODEL, backend=EMBED_BACKEND):
+    """Process-wide QueryEncoder for a model (None if the model could not be loaded)"""
+    model = get_shared_model(model_name, backend)
+    if model is None:
+        return None
+    with _MODEL_LOCK:
+        if (model_name, backend) not in _QUERY_ENCODERS:
+            _QUERY_ENCODERS[(model_name, backend)] = QueryEncoder(model)
+        return _QUERY_ENCODERS[(model_name, backend)]
+
+def _hash_rows(rows):
+    h = hashlib.sha1()
+    for row in rows:
+        h.update(repr(tuple(row)).encode('utf-8'))
+    return h.hexdigest()
+
+def fetch_versions(db_info=None):
+    """(schema_version, data_version) of the MySQL database.
+    The schema version covers every column definition plus the data_dictionary / role_access
+    contents; the data version covers each business table's UPDATE_TIME and row count (not the
+    ROW_SYNC_SKIP_TABLES, so a column-stats collector run does not force a rebuild)."""
+    conn = get_connection(db_info)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME, ORDINAL_POSITION"
+        )
+        schema_rows = cursor.fetchall()
+        cursor.execute("CHECKSUM TABLE data_dictionary, role_access")
+        schema_rows += cursor.fetchall()
+        cursor.execute(
+            "SELECT TABLE_NAME, UPDATE_TIME, TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME"
+        )
+        data_rows = [row for row in cursor.fetchall() if row[0] not in ROW_SYNC_SKIP_TABLES]
+    finally:
+        conn.close()
+    return _hash_rows(schema_rows), _hash_rows(data_rows)
+
+# Build the shared embedder's model and vector indexes in a background thread; until it is ready,
+# search() answers with BM25 so users can ask questions right after login
+EMBEDDER_BACKGROUND_WARM_UP = True
+
+# --- TWO-STAGE SCHEMA SELECTION CONFIG ---
+# Show the LLM only the tables and columns relevant to the question: tables are ranked on their
+# 'Table Description', then columns within the best tables (see SchemaEmbedder.select_schema)
+SCHEMA_SELECTION = True
+# Roles with at most this many tables always get all of them in the prompt
+SCHEMA_SELECT_MIN_TABLES = 6
+# Tables kept by stage one, and columns kept per table by stage two (key and join columns come on top)
+SCHEMA_SELECT_TABLES = 4
+SCHEMA_SELECT_COLUMNS = 15
+# Cosine similarity a table needs to count as a vector match in stage one; a question with no
+# vector match above it and no keyword match gets the role's whole schema
+SCHEMA_SELECT_MIN_SIMILARITY = 0.3
+
+def get_shared_embedder(data_dict, version=None, background=EMBEDDER_BACKGROUND_WARM_UP):
+    """Process-wide SchemaEmbedder, rebuilt only when version (e.g. fetch_versions()) changes.
+    Concurrent callers share a single build instead of embedding everything in parallel."""
+    with _EMBEDDER_LOCK:
+        current = _SHARED_EMBEDDER['embedder']
+        if current is None or (version is not None and version != _SHARED_EMBEDDER['version']):
+            print(f"Building shared schema embedder (version {version})")
+            _SHARED_EMBEDDER['embedder'] = SchemaEmbedder(data_dict=data_dict, background=background)
+            _SHARED_EMBEDDER['version'] = version
+        return _SHARED_EMBEDDER['embedder']
+
 class SchemaEmbedder:
-    def __init__(self, data_dict_path='data/data_dictionary.xlsx', data_dict=None, embed_data_rows=True):
-        try:
-            self.model = SentenceTransformer(EMBED_MODEL)
-            print(f"Using embedding model: {EMBED_MODEL}")
-        except Exception as e:
-            print(f"Warning: Could not load embedding model {EMBED_MODEL}: {e}")
-            print("Falling back to basic text matching")
-            self.model = None
+    def __init__(self, data_dict_path='data/data_dictionary.xlsx', data_dict=None, embed_data_rows=True, use_embedding_cache=True,
+                 incremental_rows=True, index_backend=VECTOR_INDEX_BACKEND, hybrid=HYBRID_SEARCH,
+                 quantization=VECTOR_QUANTIZATION, background=False, model_backend=EMBED_BACKEND):
+        # Model and query encoder are set by the warm-up (possibly in a background thread);
+        # model_backend is 'torch', 'onnx' or 'onnx-int8' (see enhanced_embedding_backend)
+        self.model_backend = model_backend
+        self.model = None
+        # One encode per question, shared by every search and cache lookup of a request
+        self.query_encoder = None
+        # Data-row search indexes: 'exact' or a FAISS 'flat' / 'ivf' / 'hnsw' index (see enhanced_vector_index)
+        self.index_backend = index_backend
+        # Data-row vectors held by the indexes: None (float32), 'float16' or 'int8'
+        self.quantization = quantization
+        # BM25 runs on its own without a model, and is fused with vector search when hybrid is on
+        self.hybrid = hybrid
+        self.schema_lexical = None
+        # Schema items and data rows are partitioned by table so a search only scans the role's tables
+        self.schema_index = None
+        self.schema_partitions = {}  # table (lower) -> (data_dict row ids, lower-cased column names)
+        # One text per table (name + 'Table Description') for the first stage of select_schema
+        self.table_names = []
+        self.table_texts = []
+        self.table_key_columns = {}  # table (lower) -> lower-cased primary / foreign key columns
+        self.table_lexical = None
+        self.table_index = None
+        self.data_row_partitions = {}  # table (lower) -> {'table', 'columns', 'rows', 'texts', 'index', 'lexical'}
+        # Roles that may only see some columns of a table get their own partition, embedded from row
+        # texts without the hidden columns; built on first use and shared by roles with the same columns.
+        # The first caller starts its build on a background thread; searches skip it until its Future is done
+        self._restricted_partitions = {}  # (table (lower), visible columns) -> Future of {'texts', 'index', 'lexical'}
+        self._partition_lock = threading.Lock()
+        # Incremental sync tracks primary keys and row hashes so only changed rows are fetched and re-embedded
+        self.embed_data_rows = embed_data_rows
+        self.incremental_rows = incremental_rows
+        self.row_sync = None
+        # Persistent per-corpus embedding caches ('schema', 'data_rows.<table>', ...): only new or changed
+        # texts are re-encoded on startup
+        self.use_embedding_cache = use_embedding_cache
+        self.embedding_caches = {}
+        self._cache_lock = threading.Lock()
+        # Warm-up progress (see readiness()) and role policies to prepare once data rows are embedded
+        self._status_lock = threading.Lock()
+        self._status = {'state': 'starting', 'progress': 0.0, 'message': 'Starting', 'error': None,
+                        'started_at': time.time(), 'ready_at': None}
+        self._warmed_up = threading.Event()
+        self._pending_policies = []
+        # Guards _pending_policies and setting _warmed_up, so a queued policy is never left behind
+        self._policy_lock = threading.Lock()
         if data_dict is not None:
             self.data_dict = data_dict
         else:
@@ -34,74 +314,401 @@ class SchemaEmbedder:
         self.embeddings = None
         self.texts = []
         self.data_row_texts = []
-        self.data_row_embeddings = None
-        # Compute embeddings once during initialization
-        if not self.data_dict.empty and self.model is not None:
-            self._embed_schema()
-        if embed_data_rows and self.model is not None:
-            self._embed_data_rows()
+        # The lexical index is cheap and built right away so search works from the start
+        if not self.data_dict.empty:
+            self._partition_schema()
+            self.texts = [f"{row['Table']} {row['Column']} {row['Column Description']}" for _, row in self.data_dict.iterrows()]
+            self.schema_lexical = BM25Index(self.texts)
+            self._build_table_corpus()
+            self.table_lexical = BM25Index(self.table_texts)
+        # Compute embeddings once: inline, or in a background thread while search falls back to BM25
+        if background:
+            threading.Thread(target=self._warm_up, name='schema-embedder-warm-up', daemon=True).start()
+        else:
+            self._warm_up()
+
+    def _set_status(self, state, progress, message, error=None):
+        with self._status_lock:
+            self._status.update(state=state, progress=progress, message=message, error=error)
+            if state == 'ready':
+                self._status['ready_at'] = time.time()
+
+    def readiness(self):
+        """Warm-up status: {'ready', 'state', 'progress' (0..1), 'message', 'error', 'started_at', 'ready_at'}.
+        state is 'starting', 'loading_model', 'embedding_schema', 'syncing_rows', 'embedding_rows',
+        'ready', or 'lexical' / 'failed' when search stays on BM25."""
+        with self._status_lock:
+            status = dict(self._status)
+        status['ready'] = status['state'] == 'ready'
+        return status
+
+    def is_ready(self):
+        return self._status['state'] == 'ready'
+
+    def wait_until_ready(self, timeout=None):
+        """Block until the warm-up has finished (ready or not); returns is_ready()"""
+        self._warmed_up.wait(timeout)
+        return self.is_ready()
+
+    def _warm_up(self):
+        """Load the model and build the vector indexes; each index is published only once complete"""
+        try:
+            self._set_status('loading_model', 0.05, 'Loading embedding model')
+            self.query_encoder = get_query_encoder(EMBED_MODEL, self.model_backend)
+            self.model = get_shared_model(EMBED_MODEL, self.model_backend)
+            if self.model is None:
+                self._set_status('lexical', 1.0, 'Embedding model unavailable, using keyword search')
+                return
+            if not self.data_dict.empty:
+                self._set_status('embedding_schema', 0.15, f"Embedding {len(self.texts)} schema items")
+                self._embed_schema()
+            if self.embed_data_rows:
+                self._embed_data_rows()
+            if self._pending_policies:
+                self._set_status('embedding_rows', 0.95, 'Embedding data rows for restricted roles')
+            while True:
+                with self._policy_lock:
+                    if not self._pending_policies:
+                        self._set_status('ready', 1.0, 'Semantic search ready')
+                        self._warmed_up.set()
+                        break
+                    policy = self._pending_policies.pop()
+                # A failed partition is logged and left out; it does not fail the rest of the warm-up
+                self._row_partitions(*policy, wait=True)
+        except Exception as e:
+            print(f"Warning: Embedder warm-up failed: {e}")
+            self._set_status('failed', 1.0, 'Warm-up failed, using keyword search', error=str(e))
+        finally:
+            with self._policy_lock:
+                self._warmed_up.set()
+
+    def _partition_schema(self):
+        partitions = {}
+        for i, (table, column) in enumerate(zip(self.data_dict['Table'], self.data_dict['Column'])):
+            ids, columns = partitions.setdefault(str(table).lower(), ([], []))
+            ids.append(i)
+            columns.append(str(column).lower())
+        self.schema_partitions = {t: (np.array(ids, dtype=np.int64), columns) for t, (ids, columns) in partitions.items()}
+
+    def _build_table_corpus(self):
+        """Table-level texts from the data dictionary: the table name and its description, or its
+        column names when it has no description"""
+        def filled(value):
+            return pd.notna(value) and str(value).strip() != ''
+        for table, rows in self.data_dict.groupby('Table', sort=False):
+            descriptions = [d for d in rows.get('Table Description', []) if filled(d)]
+            detail = str(descriptions[0]) if descriptions else ' '.join(str(c) for c in rows['Column'])
+            self.table_names.append(str(table))
+            self.table_texts.append(f"{table} {detail}")
+            keys = set()
+            for _, row in rows.iterrows():
+                if filled(row.get('PK')) or filled(row.get('Foreign Key Table')):
+                    keys.add(str(row['Column']).lower())
+            self.table_key_columns[str(table).lower()] = keys
 
     def _embed_schema(self):
         """Compute embeddings once and cache them"""
         if self.model is None:
             return
-        self.texts = [f"{row['Table']} {row['Column']} {row['Column Description']}" for _, row in self.data_dict.iterrows()]
         if self.texts:
-            self.embeddings = self.model.encode(self.texts, convert_to_tensor=True)
+            self.embeddings = self._encode_corpus('schema', self.texts)
+            self.schema_index = ExactIndex(self.embeddings)
             print(f"Embedded {len(self.texts)} schema items (cached for reuse)")
+        if self.table_texts:
+            self.table_index = ExactIndex(self._encode_corpus('tables', self.table_texts))
 
     def _embed_data_rows(self, max_rows_per_table=1000):
-        """Embed all rows from all tables in the MySQL database (up to max_rows_per_table per table)"""
+        """Embed all rows from all tables in the MySQL database (up to max_rows_per_table per table,
+        or whole tables with a primary key when incremental sync is enabled), one partition per table"""
+        rows_by_table = None
+        self._set_status('syncing_rows', 0.3, 'Syncing data rows')
+        if self.incremental_rows and self.row_sync is None:
+            self.row_sync = get_shared_row_sync()
+        if self.row_sync is not None:
+            try:
+                self.row_sync.sync()
+                rows_by_table = {table: (columns, rows) for table, columns, rows in self.row_sync.iter_tables()}
+            except Exception as e:
+                print(f"Warning: Incremental row sync failed ({e}), falling back to a full scan")
+        if rows_by_table is None:
+            try:
+                rows_by_table = self._scan_data_rows(max_rows_per_table)
+            except Exception as e:
+                print(f"Warning: Could not embed data rows from MySQL: {e}")
+                rows_by_table = {}
+        partitions = {}
+        for i, (table, (columns, rows)) in enumerate(rows_by_table.items()):
+            if not rows:
+                continue
+            self._set_status('embedding_rows', 0.4 + 0.55 * i / len(rows_by_table),
+                             f"Embedding data rows of {table} ({i + 1}/{len(rows_by_table)})")
+            partition = {'table': table, 'columns': columns, 'rows': rows}
+            partition.update(self._embed_partition(partition, columns))
+            partitions[table.lower()] = partition
+        self.data_row_partitions = partitions
+        self.data_row_texts = [text for partition in partitions.values() for text in partition['texts']]
+        if partitions:
+            print(f"Embedded {len(self.data_row_texts)} data rows in {len(partitions)} table partitions (cached for reuse)")
+
+    def _scan_data_rows(self, max_rows_per_table):
+        conn = get_connection()
         try:
-            conn = mysql.connector.connect(
-                host='localhost', user='root', password='password', database='bankexchange'
-            )
             cursor = conn.cursor()
             cursor.execute("SHOW TABLES")
             tables = [row[0] if isinstance(row, (list, tuple)) else list(row)[0] for row in cursor.fetchall()]
-            data_row_texts = []
+            rows_by_table = {}
             for table in tables:
                 df = pd.read_sql(f'SELECT * FROM `{table}` LIMIT {max_rows_per_table}', conn)
-                for _, row in df.iterrows():
-                    row_str = f"table: {table} | " + ' | '.join([f"{col}: {row[col]}" for col in df.columns])
-                    data_row_texts.append(row_str)
-            self.data_row_texts = data_row_texts
-            if self.data_row_texts and self.model is not None:
-                self.data_row_embeddings = self.model.encode(self.data_row_texts, convert_to_tensor=True)
-                print(f"Embedded {len(self.data_row_texts)} data rows (cached for reuse)")
+                rows_by_table[table] = (list(df.columns), [[str(v) for v in row] for row in df.itertuples(index=False)])
+            return rows_by_table
+        finally:
             conn.close()
+
+    def _embed_partition(self, partition, columns):
+        """Texts and search index for a table partition, showing only the given columns"""
+        table = partition['table']
+        name = 'data_rows.' + re.sub(r'[^\w-]+', '_', table)
+        if columns != partition['columns']:
+            name += '.' + hashlib.sha1('\x1f'.join(columns).encode('utf-8')).hexdigest()[:12]
+        positions = [partition['columns'].index(c) for c in columns]
+        texts = [format_row_text(table, columns, [values[i] for i in positions]) for values in partition['rows']]
+        return {
+            'texts': texts,
+            'index': self._build_index(name, self._encode_corpus(name, texts)),
+            'lexical': BM25Index(texts),
+        }
+
+    def _row_partition(self, table, allowed_columns, wait=False):
+        """The data-row partition of table as seen by a role (None when it may see none of its columns).
+        A column-restricted partition is embedded on a background thread; until it is built (or when its
+        build failed) this returns None unless wait is set, so a search leaves those rows out"""
+        partition = self.data_row_partitions.get(str(table).lower())
+        if partition is None:
+            return None
+        visible = allowed_column_set(table, allowed_columns)
+        if visible is None:
+            return partition
+        columns = [c for c in partition['columns'] if c.lower() in visible]
+        if not columns:
+            return None
+        if len(columns) == len(partition['columns']):
+            return partition
+        key = (str(table).lower(), tuple(columns))
+        with self._partition_lock:
+            future = self._restricted_partitions.get(key)
+            if future is None:
+                future = self._restricted_partitions[key] = Future()
+                threading.Thread(
+                    target=self._build_partition, args=(key, future, partition, columns),
+                    name='row-partition-builder', daemon=True,
+                ).start()
+        if wait:
+            future.exception()
+        if not future.done() or future.exception() is not None:
+            return None
+        return future.result()
+
+    def _build_partition(self, key, future, partition, columns):
+        try:
+            future.set_result(self._embed_partition(partition, columns))
+        except Exception as e:
+            print(f"Warning: Embedding data rows of {key[0]} for restricted columns failed: {e}")
+            # Forget the failure so a later search retries the build
+            with self._partition_lock:
+                self._restricted_partitions.pop(key, None)
+            future.set_exception(e)
+
+    def _row_partitions(self, allowed_tables, allowed_columns, wait=False):
+        if allowed_tables is None:
+            return list(self.data_row_partitions.values())
+        partitions = []
+        for table in dict.fromkeys(allowed_tables):
+            partition = self._row_partition(table, allowed_columns, wait=wait)
+            if partition is not None:
+                partitions.append(partition)
+        return partitions
+
+    def _allowed_schema_ids(self, allowed_tables, allowed_columns):
+        """data_dict row ids a role may see (None = no restriction)"""
+        if allowed_tables is None:
+            return None
+        ids = []
+        for table in dict.fromkeys(allowed_tables):
+            partition = self.schema_partitions.get(str(table).lower())
+            if partition is None:
+                continue
+            visible = allowed_column_set(table, allowed_columns)
+            part_ids, columns = partition
+            ids.extend(part_ids if visible is None else [i for i, c in zip(part_ids, columns) if c in visible])
+        return np.array(sorted(ids), dtype=np.int64)
+
+    def prepare_partitions(self, allowed_tables, allowed_columns):
+        """Start embedding a role's column-restricted data-row partitions in the background instead of
+        on its first question (queued until the warm-up has embedded the data rows)"""
+        with self._policy_lock:
+            if not self._warmed_up.is_set():
+                self._pending_policies.append((allowed_tables, allowed_columns))
+                return
+        if self.model is not None:
+            self._row_partitions(allowed_tables, allowed_columns)
+
+    def _embedding_cache(self, name):
+        if not self.use_embedding_cache or self.model is None:
+            return None
+        with self._cache_lock:
+            if name not in self.embedding_caches:
+                model_key = embedding_model_key(EMBED_MODEL, getattr(self.model, 'embed_backend', 'torch'))
+                self.embedding_caches[name] = EmbeddingCache(model_key, name)
+            return self.embedding_caches[name]
+
+    def _encode_corpus(self, name, texts):
+        """Encode a corpus through its on-disk cache (memory-mapped float32) when enabled"""
+        cache = self._embedding_cache(name)
+        if cache is None:
+            return self.model.encode(texts, convert_to_tensor=True)
+        try:
+            return cache.get_or_encode(texts, self.model)
+        except Exception as e:
+            print(f"Warning: embedding cache '{name}' failed ({e}), encoding without it")
+            return self.model.encode(texts, convert_to_tensor=True)
+
+    def _build_index(self, name, vectors):
+        """Search index over a corpus; FAISS indexes are persisted next to the embedding cache"""
+        cache = self._embedding_cache(name)
+        suffix = self.index_backend + (f"-{self.quantization}" if self.quantization else '')
+        try:
+            return build_index(
+                vectors, backend=self.index_backend, quantization=self.quantization,
+                cache_path=cache.sidecar_path(f"{suffix}.faiss") if cache is not None else None,
+                fingerprint=cache.fingerprint() if cache is not None else None
+            )
         except Exception as e:
-            print(f"Warning: Could not embed data rows from MySQL: {e}")
-            self.data_row_texts = []
-            self.data_row_embeddings = None
+            print(f"Warning: Could not build {suffix} index for {name} ({e}), using exact search")
+            return build_index(vectors, backend='exact', quantization=None)
+
+    def embed_question(self, question):
+        """Encode a question once so search and the SQL cache can share the vector (None without a model).
+        Recently seen questions are served from the query encoder's LRU without running the model."""
+        if self.query_encoder is None:
+            return None
+        return self.query_encoder.encode(question)
 
-    def search(self, question, top_k=5, data_row_k=3):
-        """Search using cached schema and data row embeddings - no recomputation needed"""
+    def search(self, question, top_k=5, data_row_k=3, q_emb=None, allowed_tables=None, allowed_columns=None):
+        """Search using cached schema and data row embeddings - no recomputation needed.
+        Given a role's allowed_tables / allowed_columns, only those table partitions are searched and
+        data rows are ranked on texts without the columns the role may not see. With hybrid search
+        the vector and BM25 rankings are fused; without a model, or until the warm-up has built the
+        vector indexes, BM25 is used alone."""
         schema_results = []
         data_row_results = []
-        if self.model is None or self.embeddings is None or self.data_dict.empty:
-            # Fallback to basic text matching if no embeddings
-            schema_results = self._basic_search(question, top_k)
+        if self.model is not None and q_emb is None:
+            q_emb = self.embed_question(question)
+        schema_ids = self._allowed_schema_ids(allowed_tables, allowed_columns)
+        if self.data_dict.empty:
+            pass
+        elif self.model is None or self.schema_index is None:
+            # No embeddings: lexical search only
+            ids, _ = self.schema_lexical.search(question, top_k, subset=schema_ids)
+            schema_results = [self.data_dict.iloc[int(i)] for i in ids]
         else:
-            q_emb = self.model.encode([question], convert_to_tensor=True)
-            hits = util.semantic_search(q_emb, self.embeddings, top_k=top_k)[0]
-            schema_results = [self.data_dict.iloc[int(hit['corpus_id'])] for hit in hits]
-        # Data row search
-        if self.model is not None and self.data_row_embeddings is not None and self.data_row_texts:
-            q_emb = self.model.encode([question], convert_to_tensor=True)
-            hits = util.semantic_search(q_emb, self.data_row_embeddings, top_k=data_row_k)[0]
-            data_row_results = [self.data_row_texts[int(hit['corpus_id'])] for hit in hits]
+            n = top_k * HYBRID_CANDIDATES if self.hybrid else top_k
+            ids, _ = self.schema_index.search(q_emb, n, subset=schema_ids)
+            rankings = [ids.tolist()]
+            if self.hybrid:
+                rankings.append(self.schema_lexical.search(question, n, subset=schema_ids)[0].tolist())
+            fused = reciprocal_rank_fusion(rankings, weights=[1.0, HYBRID_LEXICAL_WEIGHT])
+            schema_results = [self.data_dict.iloc[int(i)] for i in fused[:top_k]]
+        # Data row search: best rows of each allowed partition, merged by score across partitions
+        if self.model is not None and self.data_row_partitions:
+            n = data_row_k * HYBRID_CANDIDATES if self.hybrid else data_row_k
+            vector_hits, lexical_hits = [], []
+            for p, partition in enumerate(self._row_partitions(allowed_tables, allowed_columns)):
+                ids, scores = partition['index'].search(q_emb, n)
+                vector_hits.extend((float(score), (p, partition['texts'][int(i)])) for i, score in zip(ids, scores))
+                if self.hybrid:
+                    ids, scores = partition['lexical'].search(question, n)
+                    lexical_hits.extend((float(score), (p, partition['texts'][int(i)])) for i, score in zip(ids, scores))
+            rankings = [[key for _, key in sorted(hits, key=lambda h: -h[0])[:n]] for hits in (vector_hits, lexical_hits)]
+            fused = reciprocal_rank_fusion(rankings, weights=[1.0, HYBRID_LEXICAL_WEIGHT])
+            data_row_results = [text for _, text in fused[:data_row_k]]
         return schema_results, data_row_results
-    
-    def _basic_search(self, question, top_k=5):
-        """Fallback search using basic text matching"""
-        if self.data_dict.empty:
-            return []
-        question_lower = question.lower()
-        scores = []
-        for idx, row in self.data_dict.iterrows():
-            text = f"{row['Table']} {row['Column']} {row['Column Description']}".lower()
-            score = sum(1 for word in question_lower.split() if word in text)
-            scores.append((score, idx))
-        scores.sort(reverse=True)
-        return [self.data_dict.iloc[idx] for score, idx in scores[:top_k] if score > 0] 
\ No newline at end of file
+
+    def _rank(self, question, q_emb, index, lexical, subset, n, min_similarity=None):
+        """Ids from subset ranked by the vector index fused with BM25 (BM25 alone without vectors).
+        With min_similarity, vector hits scoring below it are left out, so the result is empty
+        when nothing is close to the question and no keyword matches."""
+        rankings, weights = [], []
+        if index is not None and q_emb is not None:
+            ids, scores = index.search(q_emb, n, subset=subset)
+            if min_similarity is not None:
+                ids = ids[scores >= min_similarity]
+            if len(ids):
+                rankings.append(ids.tolist())
+                weights.append(1.0)
+        if lexical is not None and (self.hybrid or not rankings):
+            rankings.append(lexical.search(question, n, subset=subset)[0].tolist())
+            weights.append(HYBRID_LEXICAL_WEIGHT if len(rankings) > 1 else 1.0)
+        return reciprocal_rank_fusion(rankings, weights=weights)
+
+    def select_schema(self, question, allowed_tables, allowed_columns, q_emb=None, include_tables=(),
+                      table_k=SCHEMA_SELECT_TABLES, column_k=SCHEMA_SELECT_COLUMNS):
+        """Two-stage schema selection for the SQL prompt. Stage one ranks the role's tables on their
+        table-level embeddings (name + 'Table Description'); stage two ranks the columns of the best
+        tables on the column embeddings, keeping primary / foreign key columns and columns shared
+        with another selected table so joins still work. include_tables (e.g. tables of matched
+        column values) are always kept.
+        Returns (tables, columns) shaped like allowed_tables / allowed_columns, or None when the
+        role's whole schema should be used: it is small, or no table matched the question, i.e. no
+        include_tables, no BM25 hit and no table embedding at least SCHEMA_SELECT_MIN_SIMILARITY from it."""
+        if not self.table_names or not allowed_tables:
+            return None
+        if self.model is not None and q_emb is None:
+            q_emb = self.embed_question(question)
+        allowed = {str(t).lower(): t for t in allowed_tables}
+        tables = list(allowed_tables)
+        if len(allowed) > SCHEMA_SELECT_MIN_TABLES:
+            ids = np.array([i for i, name in enumerate(self.table_names) if name.lower() in allowed], dtype=np.int64)
+            ranked = self._rank(question, q_emb, self.table_index, self.table_lexical, ids, table_k * HYBRID_CANDIDATES,
+                                min_similarity=SCHEMA_SELECT_MIN_SIMILARITY)
+            # include_tables repeats a table once per matched value: count each table once
+            included = list(dict.fromkeys(allowed[str(t).lower()] for t in include_tables if str(t).lower() in allowed))
+            if not ranked and not included:
+                return None
+            tables = list(included)
+            for i in ranked:
+                if len(tables) >= table_k + len(included):
+                    break
+                table = allowed[self.table_names[i].lower()]
+                if table not in tables:
+                    tables.append(table)
+        # Stage two: trim wide tables down to the columns closest to the question
+        visible = {t: list(allowed_columns.get(t, [])) for t in tables}
+        name_counts = {}
+        for cols in visible.values():
+            for c in {str(c).lower() for c in cols}:
+                name_counts[c] = name_counts.get(c, 0) + 1
+        columns = {}
+        for table in tables:
+            cols = visible[table]
+            partition = self.schema_partitions.get(str(table).lower())
+            if len(cols) <= column_k or partition is None:
+                columns[table] = cols
+                continue
+            lower = [str(c).lower() for c in cols]
+            keys = {c for c in lower if c in self.table_key_columns.get(str(table).lower(), ()) or name_counts[c] > 1}
+            part_ids, part_columns = partition
+            subset = np.array([i for i, c in zip(part_ids, part_columns) if c in lower], dtype=np.int64)
+            ranked = [str(self.data_dict.iloc[int(i)]['Column']).lower()
+                      for i in self._rank(question, q_emb, self.schema_index, self.schema_lexical, subset, len(subset))]
+            # Columns nothing ranked (e.g. no BM25 hit) follow in table order
+            chosen = []
+            for c in dict.fromkeys(ranked + lower):
+                if len(chosen) >= column_k:
+                    break
+                if c not in keys:
+                    chosen.append(c)
+            keep = keys.union(chosen)
+            columns[table] = [c for c in cols if str(c).lower() in keep]
+        if tables == list(allowed_tables) and all(len(columns[t]) == len(visible[t]) for t in tables):
+            return None
+        return tables, columns
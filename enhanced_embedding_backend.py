@@ -0,0 +1,110 @@
+import json
+import os
+import re
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+# --- CPU INFERENCE BACKEND CONFIG ---
+# 'torch' (PyTorch SentenceTransformer), 'onnx' (exported ONNX graph on ONNX Runtime) or 'onnx-int8'
+# (ONNX with dynamic int8 quantization). The ONNX backends need sentence-transformers>=3.2 and
+# optimum[onnxruntime]; if they are missing or the export fails its check, torch is used instead.
+EMBED_BACKEND = 'torch'
+# Intra-op CPU threads for torch / ONNX Runtime (None = library default, usually all cores)
+EMBED_INTRA_OP_THREADS = None
+# Exported (and quantized) ONNX models, one folder per model
+ONNX_EXPORT_DIR = os.path.join('models', 'onnx')
+# Kernel set of the int8 export: 'avx512_vnni', 'avx512', 'avx2' or 'arm64' (match the production CPUs)
+ONNX_QUANTIZATION_CONFIG = 'avx2'
+# An export is only used if every check sentence embeds within this cosine similarity of torch
+ONNX_MIN_COSINE = {'onnx': 0.999, 'onnx-int8': 0.97}
+ONNX_CHECK_SENTENCES = [
+    "customer customer_id Unique identifier of the customer",
+    "account acct_type Type of account such as savings or current",
+    "txn_hist amount Transaction amount in rupees",
+    "table: branch | branch_id: 12 | location: Mumbai | manager: R. Shah",
+    "Show me transactions where amount is greater than $1000",
+    "How many savings accounts were opened in the Mumbai branch last year?",
+]
+EMBED_BACKENDS = ('torch', 'onnx', 'onnx-int8')
+
+def embedding_model_key(model_name, backend='torch'):
+    """Name under which a model's embeddings are cached: ONNX / int8 vectors differ slightly from
+    torch ones, so each backend gets its own embedding cache"""
+    return model_name if backend == 'torch' else f"{model_name}@{backend}"
+
+def _set_torch_threads(threads):
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+def _onnx_file_name(backend):
+    if backend == 'onnx-int8':
+        return f"onnx/model_qint8_{ONNX_QUANTIZATION_CONFIG}.onnx"
+    return "onnx/model.onnx"
+
+def _export_dir(model_name):
+    slug = re.sub(r'[^\w.-]+', '_', model_name).strip('_')
+    return os.path.join(ONNX_EXPORT_DIR, slug)
+
+def check_backend(reference, candidate, sentences=ONNX_CHECK_SENTENCES):
+    """(min, mean) cosine similarity between two models' embeddings of the same sentences"""
+    a = np.asarray(reference.encode(sentences, convert_to_numpy=True, normalize_embeddings=True))
+    b = np.asarray(candidate.encode(sentences, convert_to_numpy=True, normalize_embeddings=True))
+    cosine = (a * b).sum(axis=1)
+    return float(cosine.min()), float(cosine.mean())
+
+def prepare_onnx_model(model_name, backend, reference=None):
+    """Export model_name to ONNX (and int8) once under ONNX_EXPORT_DIR and check it against torch.
+    Returns (export_dir, file_name); raises RuntimeError if the export is numerically off."""
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+    export_dir = _export_dir(model_name)
+    file_name = _onnx_file_name(backend)
+    check_path = os.path.join(export_dir, 'backend_check.json')
+    checks = {}
+    if os.path.exists(check_path):
+        with open(check_path, encoding='utf-8') as f:
+            checks = json.load(f)
+    check = checks.get(file_name)
+    if check is None or not os.path.exists(os.path.join(export_dir, file_name)):
+        if not os.path.exists(os.path.join(export_dir, 'onnx', 'model.onnx')):
+            # backend='onnx' exports the graph on the fly when the model ships without one
+            SentenceTransformer(model_name, backend='onnx').save(export_dir)
+            print(f"Exported {model_name} to ONNX in {export_dir}")
+        if backend == 'onnx-int8' and not os.path.exists(os.path.join(export_dir, file_name)):
+            export_dynamic_quantized_onnx_model(
+                SentenceTransformer(export_dir, backend='onnx'), ONNX_QUANTIZATION_CONFIG, export_dir
+            )
+            print(f"Quantized {model_name} to int8 ({ONNX_QUANTIZATION_CONFIG}) in {export_dir}")
+        candidate = SentenceTransformer(export_dir, backend='onnx', model_kwargs={'file_name': file_name})
+        min_cos, mean_cos = check_backend(reference or SentenceTransformer(model_name), candidate)
+        check = {'min_cosine': min_cos, 'mean_cosine': mean_cos, 'passed': min_cos >= ONNX_MIN_COSINE[backend]}
+        checks[file_name] = check
+        with open(check_path, 'w', encoding='utf-8') as f:
+            json.dump(checks, f, indent=2)
+        print(f"{backend} vs torch embeddings: min cosine {min_cos:.4f}, mean {mean_cos:.4f}")
+    if not check['passed']:
+        raise RuntimeError(
+            f"{backend} export of {model_name} differs from torch (min cosine {check['min_cosine']:.4f} "
+            f"< {ONNX_MIN_COSINE[backend]})"
+        )
+    return export_dir, file_name
+
+def load_embedding_model(model_name, backend=EMBED_BACKEND, threads=EMBED_INTRA_OP_THREADS):
+    """Load model_name on the given CPU backend. Returns (model, backend actually used): any
+    problem with an ONNX backend falls back to torch with a warning."""
+    if backend not in EMBED_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    _set_torch_threads(threads)
+    if backend != 'torch':
+        try:
+            export_dir, file_name = prepare_onnx_model(model_name, backend)
+            model_kwargs = {'file_name': file_name, 'provider': 'CPUExecutionProvider'}
+            if threads:
+                import onnxruntime
+                session_options = onnxruntime.SessionOptions()
+                session_options.intra_op_num_threads = threads
+                model_kwargs['session_options'] = session_options
+            return SentenceTransformer(export_dir, backend='onnx', model_kwargs=model_kwargs), backend
+        except Exception as e:
+            print(f"Warning: Could not use the {backend} embedding backend ({e}), using torch")
+    return SentenceTransformer(model_name), 'torch'
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import numpy as np
+
+# --- PERSISTENT EMBEDDING CACHE CONFIG ---
+EMBEDDING_CACHE_DIR = os.path.join('embeddings', 'cache')
+
+def text_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+class EmbeddingCache:
+    """On-disk embedding store for one corpus (e.g. 'schema' or 'data_rows') of one model.
+
+    Vectors live in a raw float32 file that is memory-mapped on load, next to a manifest listing the
+    content hash of the text behind each row. get_or_encode() only runs the model on texts whose hash
+    is not in the manifest. The file is rewritten in corpus order whenever the corpus changes, so an
+    unchanged corpus is returned as a zero-copy view of the mapping on the next start."""
+
+    def __init__(self, model_name, namespace, cache_dir=EMBEDDING_CACHE_DIR):
+        model_slug = re.sub(r'[^\w.-]+', '_', model_name).strip('_')
+        self.model_name = model_name
+        self.dir = os.path.join(cache_dir, model_slug)
+        self.vectors_path = os.path.join(self.dir, f"{namespace}.f32")
+        self.manifest_path = os.path.join(self.dir, f"{namespace}.manifest.json")
+        self._lock = threading.Lock()
+        self._hashes = []
+        self._rows = {}
+        self._dim = None
+        self._vectors = None
+        self._load()
+
+    def _load(self):
+        if not (os.path.exists(self.manifest_path) and os.path.exists(self.vectors_path)):
+            return
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('model') != self.model_name:
+                return
+            hashes, dim = manifest['hashes'], manifest['dim']
+            if os.path.getsize(self.vectors_path) != len(hashes) * dim * 4:
+                print(f"Embedding cache {self.vectors_path} is inconsistent, ignoring it")
+                return
+            # Copy-on-write mapping: zero-copy reads, and torch can wrap it without a read-only warning
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='c', shape=(len(hashes), dim)) if hashes else None
+            self._hashes, self._dim = hashes, dim
+            self._rows = {h: i for i, h in enumerate(hashes)}
+        except Exception as e:
+            print(f"Could not load embedding cache {self.manifest_path}: {e}")
+
+    def _write(self, hashes, vectors):
+        os.makedirs(self.dir, exist_ok=True)
+        # Write to temp files then rename, so a crash never leaves a half-written cache behind
+        tmp_vectors = self.vectors_path + '.tmp'
+        tmp_manifest = self.manifest_path + '.tmp'
+        np.ascontiguousarray(vectors, dtype=np.float32).tofile(tmp_vectors)
+        with open(tmp_manifest, 'w', encoding='utf-8') as f:
+            json.dump({'model': self.model_name, 'dim': int(vectors.shape[1]), 'hashes': hashes}, f)
+        try:
+            os.replace(tmp_vectors, self.vectors_path)
+            os.replace(tmp_manifest, self.manifest_path)
+        except OSError as e:
+            # e.g. Windows refuses to replace a file another embedder still has mapped: serve from memory
+            print(f"Could not persist embedding cache {self.vectors_path}: {e}")
+            self._vectors = np.asarray(vectors, dtype=np.float32)
+            self._hashes, self._dim = hashes, int(vectors.shape[1])
+            self._rows = {h: i for i, h in enumerate(hashes)}
+            return
+        self._load()
+
+    def fingerprint(self):
+        """Hash of the cached corpus (text hashes in order), e.g. to tell whether a derived index is stale"""
+        with self._lock:
+            return hashlib.sha1('\n'.join(self._hashes).encode('utf-8')).hexdigest()
+
+    def sidecar_path(self, suffix):
+        """Path for a file derived from this corpus, stored next to it (e.g. 'hnsw.faiss')"""
+        return self.vectors_path[:-len('.f32')] + '.' + suffix
+
+    def get_or_encode(self, texts, model, batch_size=64):
+        """Return a (len(texts), dim) float32 array, encoding only texts missing from the cache"""
+        if not texts:
+            return np.empty((0, self._dim or 0), dtype=np.float32)
+        hashes = [text_hash(t) for t in texts]
+        with self._lock:
+            if hashes == self._hashes and self._vectors is not None:
+                return self._vectors
+            missing = [i for i, h in enumerate(hashes) if h not in self._rows]
+            new_vectors = None
+            if missing:
+                new_vectors = np.asarray(
+                    model.encode([texts[i] for i in missing], batch_size=batch_size, convert_to_numpy=True),
+                    dtype=np.float32
+                )
+                if self._dim is not None and new_vectors.shape[1] != self._dim:
+                    # Model output changed shape under the same name: start over
+                    self._rows, self._dim = {}, None
+                    return self._encode_all(texts, hashes, model, batch_size)
+            dim = new_vectors.shape[1] if new_vectors is not None else self._dim
+            out = np.empty((len(texts), dim), dtype=np.float32)
+            known = [i for i in range(len(texts)) if hashes[i] in self._rows]
+            if known:
+                out[known] = self._vectors[[self._rows[hashes[i]] for i in known]]
+            if missing:
+                out[missing] = new_vectors
+            print(f"Embedding cache {os.path.basename(self.vectors_path)}: {len(known)} reused, {len(missing)} encoded")
+            self._write(hashes, out)
+            return self._vectors
+
+    def _encode_all(self, texts, hashes, model, batch_size):
+        vectors = np.asarray(model.encode(texts, batch_size=batch_size, convert_to_numpy=True), dtype=np.float32)
+        self._write(hashes, vectors)
+        return self._vectors
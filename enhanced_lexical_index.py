@@ -0,0 +1,111 @@
+import re
+import numpy as np
+
+# --- LEXICAL (BM25) RETRIEVAL CONFIG ---
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Fuse BM25 with vector search (reciprocal rank fusion) when the embedding model is available
+HYBRID_SEARCH = True
+# RRF damping constant: larger values flatten the difference between top ranks
+HYBRID_RRF_K = 60
+# Weight of the lexical ranking relative to the vector ranking in the fused score
+HYBRID_LEXICAL_WEIGHT = 1.0
+# Candidates taken from each ranker per requested result before fusing
+HYBRID_CANDIDATES = 4
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+STOPWORDS = {
+    'a', 'all', 'an', 'and', 'are', 'by', 'for', 'from', 'get', 'give', 'how', 'in', 'is', 'list', 'many',
+    'me', 'of', 'on', 'show', 'the', 'to', 'what', 'which', 'with',
+}
+
+def _stem(token):
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+def tokenize(text):
+    """Lower-cased alphanumeric tokens; snake_case identifiers split into words, plurals folded"""
+    return [_stem(t) for t in _TOKEN_RE.findall(str(text).lower()) if t not in STOPWORDS]
+
+class BM25Index:
+    """Inverted index with BM25 scoring over a fixed list of texts.
+
+    Texts are tokenized once at build time. Postings are stored CSR-style in flat numpy arrays:
+    for term t, doc_ids[offsets[t]:offsets[t+1]] are the documents containing it and weights holds
+    the matching precomputed BM25 term weights (idf * saturated, length-normalised tf), so a query
+    is a sum over a few array slices."""
+
+    def __init__(self, texts, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.n_docs = len(texts)
+        vocab = {}
+        term_docs = []  # term id -> {doc id: tf}
+        doc_len = np.zeros(self.n_docs, dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_len[doc_id] = len(tokens)
+            for token in tokens:
+                term_id = vocab.get(token)
+                if term_id is None:
+                    term_id = vocab[token] = len(term_docs)
+                    term_docs.append({})
+                tfs = term_docs[term_id]
+                tfs[doc_id] = tfs.get(doc_id, 0) + 1
+        self.vocab = vocab
+        avgdl = float(doc_len.mean()) if self.n_docs and doc_len.mean() > 0 else 1.0
+        self.offsets = np.zeros(len(term_docs) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum([len(d) for d in term_docs])
+        self.doc_ids = np.empty(self.offsets[-1], dtype=np.int32)
+        self.weights = np.empty(self.offsets[-1], dtype=np.float32)
+        for term_id, tfs in enumerate(term_docs):
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = np.fromiter(tfs.keys(), dtype=np.int32, count=len(tfs))
+            tf = np.fromiter(tfs.values(), dtype=np.float32, count=len(tfs))
+            idf = np.log(1.0 + (self.n_docs - len(tfs) + 0.5) / (len(tfs) + 0.5))
+            norm = k1 * (1.0 - b + b * doc_len[docs] / avgdl)
+            self.doc_ids[start:end] = docs
+            self.weights[start:end] = idf * tf * (k1 + 1.0) / (tf + norm)
+
+    def __len__(self):
+        return self.n_docs
+
+    def scores(self, query):
+        """BM25 score of every document for a query string (repeated query terms count once)"""
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for token in set(tokenize(query)):
+            term_id = self.vocab.get(token)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            scores[self.doc_ids[start:end]] += self.weights[start:end]
+        return scores
+
+    def search(self, query, k, subset=None):
+        """Return (ids, scores) of the k best matching documents with a positive score.
+        subset (array of ids) restricts the search to those documents."""
+        scores = self.scores(query)
+        if subset is not None:
+            subset = np.asarray(subset, dtype=np.int64)
+            candidates = subset[scores[subset] > 0]
+        else:
+            candidates = np.flatnonzero(scores > 0)
+        k = min(k, len(candidates))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return top, scores[top]
+
+def reciprocal_rank_fusion(rankings, weights=None, rrf_k=HYBRID_RRF_K):
+    """Fuse ranked lists of hashable ids: score(id) = sum of weight / (rrf_k + rank).
+    Returns ids sorted by fused score (ties keep first-seen order)."""
+    weights = weights or [1.0] * len(rankings)
+    fused = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, item in enumerate(ranking, start=1):
+            fused[item] = fused.get(item, 0.0) + weight / (rrf_k + rank)
+    return sorted(fused, key=lambda item: -fused[item])
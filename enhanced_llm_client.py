@@ -0,0 +1,251 @@
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- OLLAMA CLIENT CONFIG ---
+OLLAMA_BASE_URL = "http://localhost:11434"
+SQL_MODEL = "sqlcoder"
+# Seconds to open a TCP connection, and to wait for the server between bytes (the first byte
+# only arrives once the prompt is evaluated, so the read timeout must cover a slow CPU prompt eval)
+OLLAMA_CONNECT_TIMEOUT = 3.05
+OLLAMA_READ_TIMEOUT = 120
+# How long Ollama keeps the model loaded after a request (Ollama duration string, or -1 = forever)
+OLLAMA_KEEP_ALIVE = "30m"
+# Keep-alive connections held open to Ollama: at least the number of concurrent generations
+OLLAMA_POOL_SIZE = 8
+# Recent per-call latencies kept for the p50 / p95 figures in stats()
+OLLAMA_LATENCY_SAMPLES = 1000
+# Identical generations in flight at the same time (same prompt, model and options, e.g. several
+# users clicking the same sample query) share one Ollama call and its result
+OLLAMA_SINGLE_FLIGHT = True
+
+class OllamaClient:
+    """HTTP client for the Ollama API over one pooled keep-alive requests.Session.
+
+    Every call records time to first byte (response headers; for a non-streamed generation that
+    includes the whole prompt eval and decode) and total latency, plus Ollama's own load / prompt
+    eval / eval durations when the response reports them."""
+
+    def __init__(self, base_url=OLLAMA_BASE_URL, connect_timeout=OLLAMA_CONNECT_TIMEOUT, read_timeout=OLLAMA_READ_TIMEOUT,
+                 keep_alive=OLLAMA_KEEP_ALIVE, pool_size=OLLAMA_POOL_SIZE, single_flight=OLLAMA_SINGLE_FLIGHT):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.keep_alive = keep_alive
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.early_stops = 0
+        self._ttfb = deque(maxlen=OLLAMA_LATENCY_SAMPLES)
+        self._total = deque(maxlen=OLLAMA_LATENCY_SAMPLES)
+        self._ollama = {'load_ms': 0.0, 'prompt_eval_ms': 0.0, 'eval_ms': 0.0, 'prompt_tokens': 0, 'eval_tokens': 0, 'calls': 0}
+        self.last = None
+        self._local = threading.local()
+        self.single_flight = single_flight
+        self._in_flight = {}  # payload hash -> Future of (result, timings of the shared call)
+        self.flight_requests = 0
+        self.flight_coalesced = 0
+
+    def _timeout(self, read_timeout):
+        return self.timeout if read_timeout is None else (self.timeout[0], read_timeout)
+
+    def request(self, method, path, read_timeout=None, **kwargs):
+        """Send a request and read the whole body; returns the requests.Response.
+        Connection errors and timeouts are raised as requests exceptions."""
+        start = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, self.base_url + path, timeout=self._timeout(read_timeout), stream=True, **kwargs
+            )
+            ttfb = time.perf_counter() - start
+            response.content  # read the body and hand the connection back to the pool
+        except Exception:
+            with self._lock:
+                self.calls += 1
+                self.errors += 1
+            raise
+        timings = {}
+        if response.status_code == 200 and response.headers.get('Content-Type', '').startswith('application/json'):
+            try:
+                timings = response.json()
+            except ValueError:
+                timings = {}
+        self._record(ttfb, time.perf_counter() - start, response.status_code, timings)
+        return response
+
+    def get(self, path, read_timeout=None):
+        return self.request('GET', path, read_timeout=read_timeout)
+
+    def _coalesce(self, key_parts, call):
+        """Run call() once for concurrent callers with the same key_parts; the others wait for its
+        result (or exception) instead of sending the same request again"""
+        if not self.single_flight:
+            return call()
+        key = hashlib.sha256(json.dumps(key_parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        with self._lock:
+            self.flight_requests += 1
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+            else:
+                self.flight_coalesced += 1
+        if not leader:
+            result, last = future.result()
+            self._local.last = dict(last, coalesced=True) if last else None
+            return result
+        try:
+            result = call()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+        future.set_result((result, self.last_call()))
+        return result
+
+    def generate(self, payload, read_timeout=None):
+        """POST /api/generate; keep_alive is added unless the payload sets it.
+        Concurrent identical generations share one call (see OLLAMA_SINGLE_FLIGHT)."""
+        payload = dict(payload)
+        payload.setdefault('keep_alive', self.keep_alive)
+        return self._coalesce(
+            ['generate', payload],
+            lambda: self.request('POST', '/api/generate', read_timeout=read_timeout, json=payload)
+        )
+
+    def generate_stream(self, payload, stop=None, read_timeout=None):
+        """Streaming generate (see _generate_stream); concurrent identical generations with the
+        same stop predicate share one call"""
+        payload = dict(payload, stream=True)
+        payload.setdefault('keep_alive', self.keep_alive)
+        stop_name = getattr(stop, '__module__', '') + '.' + getattr(stop, '__qualname__', repr(stop)) if stop else None
+        return self._coalesce(
+            ['generate_stream', payload, stop_name],
+            lambda: self._generate_stream(payload, stop, read_timeout)
+        )
+
+    def _generate_stream(self, payload, stop, read_timeout):
+        """POST /api/generate with "stream": true and read the token stream as it arrives.
+        After each chunk stop(text so far) is called; once it returns True the request is closed,
+        which makes Ollama stop generating. Returns (status code, text, stopped early); on an HTTP
+        error text is the error body. Time to first byte is the time to the first token here."""
+        start = time.perf_counter()
+        ttfb = None
+        parts = []
+        timings = {}
+        stopped = False
+        try:
+            response = self.session.post(
+                self.base_url + '/api/generate', json=payload, timeout=self._timeout(read_timeout), stream=True
+            )
+            try:
+                if response.status_code != 200:
+                    ttfb = time.perf_counter() - start
+                    parts.append(response.text)
+                else:
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        if ttfb is None:
+                            ttfb = time.perf_counter() - start
+                        chunk = json.loads(line)
+                        if chunk.get('error'):
+                            raise RuntimeError(f"Ollama error: {chunk['error']}")
+                        parts.append(chunk.get('response', ''))
+                        if chunk.get('done'):
+                            timings = chunk
+                            break
+                        if stop is not None and stop(''.join(parts)):
+                            stopped = True
+                            break
+            finally:
+                # Closing an unfinished stream drops its connection: Ollama sees the disconnect and
+                # stops decoding; finished streams return their connection to the pool
+                response.close()
+        except Exception:
+            with self._lock:
+                self.calls += 1
+                self.errors += 1
+            raise
+        total = time.perf_counter() - start
+        self._record(ttfb if ttfb is not None else total, total, response.status_code, timings, stopped=stopped)
+        return response.status_code, ''.join(parts), stopped
+
+    def _record(self, ttfb, total, status, timings, stopped=False):
+        with self._lock:
+            self.calls += 1
+            if status != 200:
+                self.errors += 1
+            if stopped:
+                self.early_stops += 1
+            self._ttfb.append(ttfb * 1000)
+            self._total.append(total * 1000)
+            self.last = self._local.last = {
+                'ttfb_ms': ttfb * 1000, 'total_ms': total * 1000, 'status': status, 'stopped_early': stopped
+            }
+            if isinstance(timings, dict) and 'eval_duration' in timings:
+                # Ollama reports durations in nanoseconds
+                ollama = self._ollama
+                ollama['calls'] += 1
+                ollama['load_ms'] += timings.get('load_duration', 0) / 1e6
+                ollama['prompt_eval_ms'] += timings.get('prompt_eval_duration', 0) / 1e6
+                ollama['eval_ms'] += timings.get('eval_duration', 0) / 1e6
+                ollama['prompt_tokens'] += timings.get('prompt_eval_count', 0)
+                ollama['eval_tokens'] += timings.get('eval_count', 0)
+                self.last.update(
+                    prompt_eval_ms=timings.get('prompt_eval_duration', 0) / 1e6,
+                    prompt_tokens=timings.get('prompt_eval_count', 0),
+                    eval_ms=timings.get('eval_duration', 0) / 1e6,
+                    eval_tokens=timings.get('eval_count', 0),
+                )
+
+    def last_call(self):
+        """Timings of the calling thread's most recent request (None if it made none)"""
+        return getattr(self._local, 'last', None)
+
+    def stats(self):
+        with self._lock:
+            ttfb = np.array(self._ttfb) if self._ttfb else None
+            total = np.array(self._total) if self._total else None
+            ollama = dict(self._ollama)
+            report = {
+                'calls': self.calls,
+                'errors': self.errors,
+                'early_stops': self.early_stops,
+                'single_flight': {
+                    'requests': self.flight_requests,
+                    'backend_calls': self.flight_requests - self.flight_coalesced,
+                    'coalesced': self.flight_coalesced,
+                    'in_flight': len(self._in_flight),
+                    'dedupe_ratio': self.flight_coalesced / self.flight_requests if self.flight_requests else 0.0,
+                },
+                'ttfb_ms_p50': float(np.percentile(ttfb, 50)) if ttfb is not None else 0.0,
+                'ttfb_ms_p95': float(np.percentile(ttfb, 95)) if ttfb is not None else 0.0,
+                'total_ms_p50': float(np.percentile(total, 50)) if total is not None else 0.0,
+                'total_ms_p95': float(np.percentile(total, 95)) if total is not None else 0.0,
+                'last': dict(self.last) if self.last else None,
+            }
+        n = ollama.pop('calls')
+        report.update({f"avg_{k}": v / n if n else 0.0 for k, v in ollama.items()})
+        return report
+
+_CLIENT_LOCK = threading.Lock()
+_SHARED_CLIENT = {'client': None}
+
+def get_llm_client():
+    """Process-wide OllamaClient, so every session reuses the same keep-alive connections"""
+    with _CLIENT_LOCK:
+        if _SHARED_CLIENT['client'] is None:
+            _SHARED_CLIENT['client'] = OllamaClient()
+        return _SHARED_CLIENT['client']
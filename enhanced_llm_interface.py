@@ -4,6 +4,58 @@ import json
 import re
 import sqlparse
 import difflib
+import pandas as pd
+from enhanced_llm_client import SQL_MODEL, get_llm_client
+from enhanced_prompt_builder import LLM_NUM_CTX, LLM_NUM_PREDICT, PROMPT_STATS, PROMPT_TOKEN_BUDGET, PromptBuilder
+
+# --- SQL GENERATION CONFIG ---
+# Stream tokens from Ollama and stop generating as soon as a complete SQL statement has arrived
+LLM_STREAMING = True
+
+class SQLGenerationError(Exception):
+    """The LLM returned no usable SQL (invalid output, API error, timeout); raised by
+    generate_sql_llm(fallback=False) instead of returning the generate_simple_sql query"""
+
+_STATEMENT_START_RE = re.compile(r'\b(SELECT|WITH|INSERT|UPDATE|DELETE)\b', re.IGNORECASE)
+
+def sql_statement_end(text):
+    """Index of the ';' ending the first SQL statement in text (outside quotes and comments), or -1"""
+    start = _STATEMENT_START_RE.search(text)
+    if start is None:
+        return -1
+    quote = None
+    i = start.start()
+    while i < len(text):
+        ch = text[i]
+        if quote is not None:
+            if ch == quote:
+                # A doubled quote inside a literal is an escaped quote
+                if text[i + 1:i + 2] == quote:
+                    i += 1
+                else:
+                    quote = None
+            elif ch == '\\' and quote != '`':
+                i += 1
+        elif ch in ("'", '"', '`'):
+            quote = ch
+        elif ch == '-' and text[i + 1:i + 2] == '-' or ch == '#':
+            end = text.find('\n', i)
+            if end < 0:
+                return -1
+            i = end
+        elif ch == '/' and text[i + 1:i + 2] == '*':
+            end = text.find('*/', i + 2)
+            if end < 0:
+                return -1
+            i = end + 1
+        elif ch == ';':
+            return i
+        i += 1
+    return -1
+
+def sql_statement_complete(text):
+    """True once text contains a complete, ';'-terminated SQL statement"""
+    return sql_statement_end(text) >= 0
 
 def clean_sql_response(sql, allowed_tables=None, allowed_columns=None, user_question=None):
     """Clean and validate SQL response from LLM. Only perform basic cleaning, plus a simple-table fallback for simple prompts."""
@@ -15,8 +67,10 @@ def clean_sql_response(sql, allowed_tables=None, allowed_columns=None, user_ques
     sql = re.sub(r'\s*```$', '', sql, flags=re.IGNORECASE)
     # Remove any non-SQL text before the query
     sql = re.sub(r'^.*?(SELECT|WITH|INSERT|UPDATE|DELETE)', r'\1', sql, flags=re.IGNORECASE | re.DOTALL)
-    # Remove any text after the query
-    sql = re.sub(r';\s*.*$', ';', sql, flags=re.DOTALL)
+    # Remove any text after the query (a ';' inside a quoted literal does not end it)
+    end = sql_statement_end(sql)
+    if end >= 0:
+        sql = sql[:end + 1]
     # Clean up whitespace
     sql = re.sub(r'\s+', ' ', sql).strip()
     # Replace ILIKE with LIKE (SQLite does not support ILIKE)
@@ -79,47 +133,24 @@ def validate_sql_syntax(sql):
     
     return True, "Valid SQL syntax"
 
-def generate_sql_llm(question, allowed_tables, allowed_columns, data_dict, rag_context=None, previous_query=None, previous_result_columns=None):
-    """
-    Generate a SQL query from a user question using SQLCoder via Ollama.
-    """
-    try:
-        # Ollama API endpoint
-        OLLAMA_URL = "http://localhost:11434/api/generate"
-        
-        # --- COMPACT TABLE DICTIONARY CONTEXT ---
-        table_dict_lines = []
-        for table in allowed_tables:
-            columns = allowed_columns.get(table, [])
-            table_dict_lines.append(f"{table}: {', '.join(columns)}")
-        table_dict_context = '\n'.join(table_dict_lines)
-        
-        # Create clear schema context with foreign keys (for reference, not at top)
-        schema_lines = []
-        for table in allowed_tables:
-            columns = allowed_columns.get(table, [])
-            schema_lines.append(f"Table `{table}` has columns: `{', '.join(columns)}`.")
-            
-            # Add foreign key info from data dictionary if available
-            if data_dict is not None and not data_dict.empty:
-                fk_info = data_dict[(data_dict['Table'] == table) & (data_dict['Foreign Key Table'].notna())]
-                if not fk_info.empty:
-                    fks = []
-                    for _, row in fk_info.iterrows():
-                        fks.append(f"`{row['Column']}` -> `{row['Foreign Key Table']}`.`{row['Foreign Key Column']}`")
-                    schema_lines.append(f"  - Foreign Keys: {'; '.join(fks)}")
-                
-                # Add table description if available
-                table_desc = data_dict[data_dict['Table'] == table]['Table Description'].iloc[0] if not data_dict[data_dict['Table'] == table].empty else ""
-                if table_desc:
-                    schema_lines.append(f"  - Description: {table_desc}")
-            
-            schema_lines.append("")
+# --- PROMPT LAYOUT ---
+# Every SQL prompt starts with this static block (rules, then few-shot examples), byte-identical across
+# requests, so Ollama can reuse its KV cache for it. Role-specific schema comes next (shared by a
+# role's questions), and the per-question context and question last.
+SQL_PROMPT_RULES = """### CRITICAL RULES:
+1. Output ONLY the SQL query - no explanations, no markdown, no extra text. Always end with a semicolon.
+2. Use ONLY the tables and columns listed under DATABASE SCHEMA below, with their exact names. NEVER invent, guess or assume any other table or column: a query that uses one will be rejected.
+3. Use backticks for table and column names: `table_name`.`column_name`
+4. Always prefer the simplest query that answers the question. If it can be answered from a single table, use only that table and its columns; use JOINs or subqueries only when the question clearly needs data from multiple tables or complex logic.
+5. Use aggregations (AVG, SUM, COUNT, etc.), GROUP BY, HAVING or window functions only if the question asks for aggregation or grouping.
+6. If the question is ambiguous, generate a simple query using the most relevant table and columns from the schema.
+7. Use valid SQLite syntax only.
+8. For case-insensitive matching, use LIKE (SQLite does not support ILIKE), or LOWER(column) LIKE ...
+9. For comparisons, use: WHERE column > 50000 or WHERE column < 1000
+10. For date filtering, use date strings in the format 'YYYY-MM-DD' directly, e.g. WHERE date_column BETWEEN 'YYYY-MM-DD' AND 'YYYY-MM-DD' or WHERE date_column >= date('now', '-1 month'). Do NOT use to_date, cast, or convert functions.
+11. For extracting year, month, or day from a date, use strftime('%Y', date_column) for year, strftime('%m', date_column) for month, etc. Do NOT use to_char, to_number, extract, or date_part."""
 
-        schema_context = '\n'.join(schema_lines)
-        
-        # --- FEW-SHOT EXAMPLES ---
-        few_shot_examples = '''
+SQL_FEW_SHOT_EXAMPLES = '''
 ### EXAMPLE 1
 DATABASE SCHEMA
 Table `customers` has columns: `customer_id`, `name`, `dob`, `address`.
@@ -157,84 +188,137 @@ GOOD SQL QUERY
 SELECT * FROM txn_hist;
 '''
 
-        # --- PREVIOUS QUERY/RESULT CONTEXT ---
-        previous_context = ""
-        if previous_query:
-            previous_context += f"\n### PREVIOUS QUERY\n{previous_query}\n"
-        if previous_result_columns:
-            if isinstance(previous_result_columns, (list, tuple)):
-                col_str = ', '.join(previous_result_columns)
-            else:
-                col_str = str(previous_result_columns)
-            previous_context += f"\n### PREVIOUS RESULT COLUMNS\n{col_str}\n"
+SQL_PROMPT_PREFIX = SQL_PROMPT_RULES.strip('\n') + "\n\n" + SQL_FEW_SHOT_EXAMPLES.strip('\n')
 
-        # --- Available tables list ---
-        available_tables_str = ', '.join(allowed_tables)
-        # Enhanced prompt with compact schema context at the top and strong rule
-        prompt = f"""
-### TABLES AND COLUMNS (USE ONLY THESE):
-{table_dict_context}
+# --- PROMPT BUDGET ---
+# Priority of prompt sections when the prompt is over PROMPT_TOKEN_BUDGET: the lowest is trimmed first
+# (data-row examples, then retrieved schema descriptions, then the few-shot examples, ...). The rules,
+# the schema table list, the previous query and the question are never trimmed.
+PROMPT_SECTION_PRIORITIES = {
+    'rag:### RELEVANT DATA ROWS': 10,
+    'rag:### RELEVANT SCHEMA CONTEXT': 20,
+    'rag': 25,
+    'schema_details': 40,
+    'rag:### MATCHING COLUMN VALUES': 60,
+}
 
-You MUST use only the table names and column names listed above. If you use any other table or column, your answer will be rejected.
+def _split_rag_context(rag_context):
+    """[(header, body lines)] of the '### ' sections of a RAG context string"""
+    sections = []
+    for line in (rag_context or '').split('\n'):
+        if line.startswith('### '):
+            sections.append((line, []))
+        elif line.strip():
+            if not sections:
+                sections.append((None, []))
+            sections[-1][1].append(line)
+    return [(header, lines) for header, lines in sections if lines]
 
-### CRITICAL RULES:
-1. Output ONLY the SQL query - no explanations, no markdown, no extra text
-2. Use ONLY the provided table and column names - NEVER invent or guess table or column names
-3. Use valid SQLite syntax only
-4. Use backticks for table and column names: `table_name`.`column_name`
-5. Always prefer the simplest possible query that answers the question. If a single-table query suffices, do not use multiple tables.
-6. Do NOT use JOINs, subqueries, or advanced SQL unless the question clearly requires data from multiple tables or complex logic.
-7. Avoid GROUP BY, HAVING, or window functions unless the question asks for aggregation or grouping.
-8. Use aggregations (AVG, SUM, COUNT, etc.) only if the question requires it.
-9. For date filtering, use: WHERE date_column >= date('now', '-1 month')
-10. For comparisons, use: WHERE column > 50000 or WHERE column < 1000
-11. Always end with semicolon
-12. CAREFULLY read the data dictionary and schema to understand what is required and what is available. Do not invent columns or tables.
-13. For case-insensitive matching, use LIKE (SQLite does not support ILIKE). If you need to ensure case-insensitivity, use LOWER(column) LIKE ...
-14. For extracting year, month, or day from a date in SQLite, use strftime('%Y', date_column) for year, strftime('%m', date_column) for month, etc. Do NOT use to_char, to_number, extract, or date_part.
-15. For date parsing and filtering in SQLite, use the date string format 'YYYY-MM-DD' directly. Do NOT use to_date, cast, or convert functions. For date ranges, use WHERE date_column BETWEEN 'YYYY-MM-DD' AND 'YYYY-MM-DD'.
-16. ONLY use table and column names that are explicitly listed in the provided schema and data dictionary. NEVER invent or guess table or column names.
-17. If a column or table is not present in the schema, do NOT use it in the query.
-18. If the question is ambiguous, generate a simple query using the most relevant table and columns from the schema.
-19. STRICT SCHEMA ADHERENCE: You can ONLY use tables and columns that are explicitly provided. Any table or column not in the schema is FORBIDDEN.
-20. NO HALLUCINATION: Do not create, invent, or assume the existence of any tables or columns not explicitly listed.
-21. Do NOT use JOINs unless the question explicitly requires data from multiple tables. If the question only asks about one table, use only that table.
-22. **WARNING: If you use a table or column not in the schema, your answer will be rejected.**
-23. If the user's question can be answered from a single table, use only that table and do not include columns from other tables.
+def _rag_priority(header):
+    for key, priority in PROMPT_SECTION_PRIORITIES.items():
+        if header and key.startswith('rag:') and header.startswith(key[4:]):
+            return priority
+    return PROMPT_SECTION_PRIORITIES['rag']
+
+def build_sql_prompt(question, allowed_tables, allowed_columns, data_dict, rag_context=None, previous_query=None, previous_result_columns=None,
+                     budget=PROMPT_TOKEN_BUDGET):
+    """Assemble the SQL prompt: static SQL_PROMPT_PREFIX, then the role's schema, then the
+    per-question context and the question, trimmed to budget tokens (see PromptBuilder).
+    Returns (prompt, report)."""
+    builder = PromptBuilder(budget)
+    builder.add('rules', SQL_PROMPT_RULES.strip('\n'), priority=100, required=True, dedupe=False)
+    # Rules and few-shots make up SQL_PROMPT_PREFIX and must stay byte-identical: never trimmed
+    builder.add('few_shots', SQL_FEW_SHOT_EXAMPLES.strip('\n'), priority=100, required=True, dedupe=False)
+
+    # Schema, listed once: the columns of each table, then table descriptions and foreign keys
+    schema_lines = []
+    for table in allowed_tables:
+        columns = allowed_columns.get(table, [])
+        schema_lines.append(f"Table `{table}` has columns: {', '.join(f'`{c}`' for c in columns)}.")
+    detail_lines = []
+    if data_dict is not None and not data_dict.empty:
+        rows_by_table = {table: rows for table, rows in data_dict.groupby('Table', sort=False)}
+        for table in allowed_tables:
+            rows = rows_by_table.get(table)
+            if rows is None:
+                continue
+            details = []
+            if 'Table Description' in rows:
+                table_desc = next((d for d in rows['Table Description'] if pd.notna(d) and str(d).strip()), None)
+                if table_desc:
+                    details.append(f"Description: {table_desc}")
+            if 'Foreign Key Table' in rows:
+                fks = [f"`{row['Column']}` -> `{row['Foreign Key Table']}`.`{row['Foreign Key Column']}`"
+                       for _, row in rows.iterrows() if pd.notna(row['Foreign Key Table']) and str(row['Foreign Key Table']).strip()]
+                if fks:
+                    details.append(f"Foreign Keys: {'; '.join(fks)}")
+            if details:
+                detail_lines.append(f"- `{table}`: {'. '.join(details)}")
+    builder.add('schema', schema_lines, header="### DATABASE SCHEMA (USE ONLY THESE TABLES AND COLUMNS)",
+                priority=90, required=True)
+    builder.add('schema_details', detail_lines, header="### TABLE DETAILS",
+                priority=PROMPT_SECTION_PRIORITIES['schema_details'])
 
-### DATABASE SCHEMA (REFERENCE)
-{schema_context}
+    # --- PREVIOUS QUERY/RESULT CONTEXT ---
+    if previous_query:
+        builder.add('previous_query', previous_query, header="### PREVIOUS QUERY", priority=80, required=True)
+    if previous_result_columns:
+        if isinstance(previous_result_columns, (list, tuple)):
+            col_str = ', '.join(previous_result_columns)
+        else:
+            col_str = str(previous_result_columns)
+        builder.add('previous_result_columns', col_str, header="### PREVIOUS RESULT COLUMNS", priority=80, required=True)
 
-{few_shot_examples}
-{previous_context}
-### RAG CONTEXT (Additional relevant context)
-{rag_context if rag_context else "No additional context."}
+    for header, lines in _split_rag_context(rag_context):
+        name = 'rag:' + (header[4:].split(' (')[0].lower() if header else 'context')
+        builder.add(name, lines, header=header, priority=_rag_priority(header))
 
-### USER QUESTION
-{question}
+    builder.add('question', [question, '', '### SQL QUERY (ONLY THE QUERY, NO EXPLANATIONS)'],
+                header="### USER QUESTION", priority=100, required=True, dedupe=False)
+    return builder.build()
 
-### SQL QUERY (ONLY THE QUERY, NO EXPLANATIONS)
-"""
+def generate_sql_llm(question, allowed_tables, allowed_columns, data_dict, rag_context=None, previous_query=None, previous_result_columns=None,
+                     fallback=True):
+    """
+    Generate a SQL query from a user question using SQLCoder via Ollama.
+    When the LLM gives no usable SQL, the generate_simple_sql query is returned, or with
+    fallback=False SQLGenerationError is raised so the caller can retry and knows not to cache.
+    """
+    try:
+        prompt, prompt_report = build_sql_prompt(
+            question, allowed_tables, allowed_columns, data_dict, rag_context=rag_context,
+            previous_query=previous_query, previous_result_columns=previous_result_columns
+        )
         
         # Prepare request for Ollama
         payload = {
-            "model": "sqlcoder",
+            "model": SQL_MODEL,
             "prompt": prompt,
             "stream": False,
             "options": {
                 "temperature": 0.0,
                 "top_p": 0.9,
-                "num_predict": 256,
+                "num_predict": LLM_NUM_PREDICT,
+                "num_ctx": LLM_NUM_CTX,
                 "stop": ["\n\n", "###", "Explanation:", "Here's", "The query"]
             }
         }
         
-        # Make request to Ollama
-        response = requests.post(OLLAMA_URL, json=payload, timeout=60)
+        # Make request to Ollama over the shared keep-alive session
+        client = get_llm_client()
+        if LLM_STREAMING:
+            # Stop decoding at the first complete statement: clean_sql_response drops the rest anyway
+            status_code, text, _ = client.generate_stream(payload, stop=sql_statement_complete)
+        else:
+            response = client.generate(payload)
+            status_code, text = response.status_code, response.text
+            if status_code == 200:
+                text = response.json().get('response', '')
+        last_call = client.last_call()
+        PROMPT_STATS.record(prompt_report, last_call['total_ms'] if last_call else None)
         
-        if response.status_code == 200:
-            result = response.json()
-            sql = result.get('response', '').strip()
+        if status_code == 200:
+            sql = text.strip()
             
             # Clean the SQL response
             sql = clean_sql_response(sql, allowed_tables, allowed_columns, question)
@@ -247,18 +331,24 @@ You MUST use only the table names and column names listed above. If you use any
             else:
                 print(f"Generated SQL failed validation: {validation_msg}")
                 print(f"Raw SQL: {sql}")
+                if not fallback:
+                    raise SQLGenerationError(f"Generated SQL failed validation: {validation_msg}")
                 # Fall back to simple query generation
                 return generate_simple_sql(question, allowed_tables, allowed_columns)
         else:
-            print(f"Ollama API error: {response.status_code} - {response.text}")
-            raise Exception(f"Ollama API returned status code {response.status_code}")
+            print(f"Ollama API error: {status_code} - {text}")
+            raise Exception(f"Ollama API returned status code {status_code}")
             
     except requests.exceptions.ConnectionError:
         print("Error: Could not connect to Ollama. Make sure Ollama is running and the sqlcoder model is installed.")
         print("To install sqlcoder: ollama pull sqlcoder")
         raise Exception("Ollama connection failed. Please ensure Ollama is running and sqlcoder model is installed.")
+    except SQLGenerationError:
+        raise
     except Exception as e:
         print(f"LLM Error: {e}")
+        if not fallback:
+            raise SQLGenerationError(f"LLM error: {e}") from e
         return generate_simple_sql(question, allowed_tables, allowed_columns)
 
 def generate_simple_sql(question, allowed_tables, allowed_columns):
@@ -0,0 +1,152 @@
+import re
+import threading
+from collections import deque
+import numpy as np
+
+# --- PROMPT BUDGET CONFIG ---
+# Context window requested from Ollama and tokens reserved for the generated SQL
+LLM_NUM_CTX = 4096
+LLM_NUM_PREDICT = 256
+# Prompt tokens allowed; past this the lowest-value sections are trimmed (required ones never are)
+PROMPT_TOKEN_BUDGET = LLM_NUM_CTX - LLM_NUM_PREDICT - 64
+# Token estimate: the larger of characters / PROMPT_CHARS_PER_TOKEN and the count of words and symbols
+# (a fair upper bound for the Llama / StarCoder vocabularies of SQLCoder on schema-heavy text)
+PROMPT_CHARS_PER_TOKEN = 3.2
+# Print one line per prompt with its estimated size, trimmed sections and LLM latency (debugging only:
+# the totals are always reported as 'prompt' in the query agent's get_metrics())
+PROMPT_LOG = False
+# Recent prompts kept for stats(), and the prompt-size buckets latency is reported for
+PROMPT_STATS_SAMPLES = 1000
+PROMPT_TOKEN_BUCKETS = (1000, 2000, 3000)
+
+_PIECE_RE = re.compile(r'\w+|[^\w\s]')
+
+def estimate_tokens(text):
+    """Approximate token count of text (no tokenizer needed)"""
+    if not text:
+        return 0
+    return max(len(_PIECE_RE.findall(text)), int(len(text) / PROMPT_CHARS_PER_TOKEN + 0.5))
+
+class PromptBuilder:
+    """Assembles a prompt from named sections, kept in the order they are added and separated by a
+    blank line, under a token budget.
+
+    Each section has a header, body lines and a priority (higher = more valuable). Body lines that
+    already appear in a higher-priority section, or earlier in the same one, are dropped. While the
+    estimate is over budget, sections are trimmed lowest priority first: 'lines' sections lose lines
+    from the end (put the best content first), 'all' sections are dropped whole. Required sections
+    are never trimmed. A section left without body lines is left out, header included."""
+
+    def __init__(self, budget=PROMPT_TOKEN_BUDGET):
+        self.budget = budget
+        self.sections = []
+
+    def add(self, name, body, header=None, priority=0, required=False, trim='lines', dedupe=True):
+        lines = body.split('\n') if isinstance(body, str) else list(body)
+        self.sections.append({
+            'name': name, 'header': header, 'lines': lines, 'priority': priority,
+            'required': required, 'trim': trim, 'dedupe': dedupe,
+        })
+        return self
+
+    def build(self):
+        """Returns (prompt, report); report has the estimated tokens per section, the total,
+        the budget, the trimmed section names and the number of duplicate lines dropped"""
+        seen = set()
+        duplicates = 0
+        for section in sorted(self.sections, key=lambda s: -s['priority']):
+            if not section['dedupe']:
+                continue
+            kept = []
+            for line in section['lines']:
+                key = line.strip()
+                if key and key in seen:
+                    duplicates += 1
+                    continue
+                if key:
+                    seen.add(key)
+                kept.append(line)
+            section['lines'] = kept
+        for section in self.sections:
+            section['line_tokens'] = [estimate_tokens(line) + 1 for line in section['lines']]
+            section['header_tokens'] = estimate_tokens(section['header']) + 1 if section['header'] else 0
+        total = sum(self._tokens(s) for s in self.sections)
+        trimmed = []
+        for section in sorted(self.sections, key=lambda s: s['priority']):
+            if total <= self.budget:
+                break
+            if section['required'] or not self._has_body(section):
+                continue
+            trimmed.append(section['name'])
+            before = self._tokens(section)
+            if section['trim'] == 'lines':
+                while section['lines'] and total - before + self._tokens(section) > self.budget:
+                    section['lines'].pop()
+                    section['line_tokens'].pop()
+            else:
+                section['lines'], section['line_tokens'] = [], []
+            total += self._tokens(section) - before
+        parts = []
+        for section in self.sections:
+            if self._has_body(section):
+                lines = ([section['header']] if section['header'] else []) + section['lines']
+                parts.append('\n'.join(lines).strip('\n'))
+        report = {
+            'tokens': total,
+            'budget': self.budget,
+            'sections': {s['name']: self._tokens(s) for s in self.sections},
+            'trimmed': trimmed,
+            'duplicate_lines': duplicates,
+        }
+        if total > self.budget:
+            print(f"Warning: required prompt sections need ~{total} tokens, over the budget of {self.budget}")
+        return '\n\n'.join(parts) + '\n', report
+
+    @staticmethod
+    def _has_body(section):
+        return any(line.strip() for line in section['lines'])
+
+    def _tokens(self, section):
+        if not self._has_body(section):
+            return 0
+        return section['header_tokens'] + sum(section['line_tokens'])
+
+class PromptStats:
+    """Estimated prompt sizes and LLM latencies of recent requests"""
+
+    def __init__(self, samples=PROMPT_STATS_SAMPLES):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=samples)  # (tokens, latency ms or None)
+        self.prompts = 0
+        self.trimmed = 0
+        self.duplicate_lines = 0
+
+    def record(self, report, latency_ms=None):
+        with self._lock:
+            self.prompts += 1
+            self.trimmed += bool(report['trimmed'])
+            self.duplicate_lines += report['duplicate_lines']
+            self._samples.append((report['tokens'], latency_ms))
+        if PROMPT_LOG:
+            trimmed = f", trimmed {', '.join(report['trimmed'])}" if report['trimmed'] else ''
+            latency = f", LLM {latency_ms:.0f} ms" if latency_ms is not None else ''
+            print(f"SQL prompt: ~{report['tokens']} tokens (budget {report['budget']}{trimmed}){latency}")
+
+    def stats(self):
+        """Token percentiles plus average latency per prompt-size bucket (PROMPT_TOKEN_BUCKETS)"""
+        with self._lock:
+            samples = list(self._samples)
+            report = {'prompts': self.prompts, 'trimmed': self.trimmed, 'duplicate_lines': self.duplicate_lines}
+        tokens = np.array([t for t, _ in samples]) if samples else None
+        report['tokens_p50'] = float(np.percentile(tokens, 50)) if tokens is not None else 0.0
+        report['tokens_p95'] = float(np.percentile(tokens, 95)) if tokens is not None else 0.0
+        edges = (0,) + tuple(PROMPT_TOKEN_BUCKETS) + (None,)
+        buckets = {}
+        for low, high in zip(edges, edges[1:]):
+            latencies = [ms for t, ms in samples if ms is not None and t >= low and (high is None or t < high)]
+            label = f"{low}+" if high is None else f"{low}-{high}"
+            buckets[label] = {'count': len(latencies), 'avg_ms': float(np.mean(latencies)) if latencies else None}
+        report['latency_by_tokens'] = buckets
+        return report
+
+PROMPT_STATS = PromptStats()
@@ -1,8 +1,31 @@
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
-from enhanced_llm_interface import generate_sql_llm
-from enhanced_embedding import SchemaEmbedder
-import mysql.connector
+from enhanced_llm_interface import SQLGenerationError, generate_simple_sql, generate_sql_llm
+from enhanced_llm_client import get_llm_client
+from enhanced_prompt_builder import PROMPT_STATS
+from enhanced_column_stats import ColumnStatsCatalog
+from enhanced_embedding import SCHEMA_SELECTION, SchemaEmbedder
+from enhanced_value_index import format_value_matches, get_shared_value_index
+from enhanced_cache import SQL_CACHE, RESULT_CACHE, policy_fingerprint, frame_fingerprint
+from enhanced_db_pool import get_connection as get_pooled_connection, pool_stats
+
+# --- SQL GENERATION STRATEGIES ---
+# 'rag' prompts with the retrieved schema/data-row context, 'full' with the full allowed schema only.
+# Order is the preference order when neither candidate passes validation.
+GENERATION_STRATEGIES = ('rag', 'full')
+GENERATION_WORKERS = 8
+# Shared by all QueryAgent instances so concurrent Streamlit sessions don't each spawn threads
+_GENERATION_EXECUTOR = ThreadPoolExecutor(max_workers=GENERATION_WORKERS, thread_name_prefix='sqlgen')
+
+# --- RESULT STREAMING ---
+# Rows fetched per round trip from the unbuffered cursor, and the most rows kept for one answer
+STREAM_PAGE_SIZE = 500
+MAX_RESULT_ROWS = 10000
+
+NOT_ALLOWED_MSG = "You are not allowed to access the requested data or the query could not be generated."
 
 def filter_sql_to_allowed(sql_query, allowed_tables, allowed_columns):
     # Basic check: only allow queries on allowed tables/columns
@@ -175,8 +198,109 @@ def validate_sql(sql_query, allowed_tables, allowed_columns):
             return False, f"Invalid character '{char}' in SQL query"
     return True, "SQL validation passed."
 
-def execute_sql_safely(sql_query, db_type, db_info):
-    """Execute SQL query with better error handling for SQLite or MySQL"""
+def vet_sql_candidate(sql_query, allowed_tables, allowed_columns):
+    """Run a generated SQL candidate through filter_sql_to_allowed and validate_sql.
+    Returns (ok, sql, message): on success sql is the (possibly auto-corrected) query to execute,
+    on failure message is the user-facing error and sql is the offending query (or None)."""
+    if not sql_query or not filter_sql_to_allowed(sql_query, allowed_tables, allowed_columns):
+        return False, None, NOT_ALLOWED_MSG
+    val_result = validate_sql(sql_query, allowed_tables, allowed_columns)
+    if isinstance(val_result, tuple) and len(val_result) == 3 and val_result[0] == 'corrected':
+        # Auto-corrected query: use the corrected SQL and inform the user
+        correction_msg = val_result[1]
+        corrected_sql = val_result[2]
+        # Validate the corrected SQL (should not recurse infinitely)
+        is_valid2, validation_msg2 = validate_sql(corrected_sql, allowed_tables, allowed_columns)
+        if is_valid2 is True:
+            return True, corrected_sql, correction_msg + ' ' + validation_msg2
+        return False, corrected_sql, f"SQL validation failed after correction: {validation_msg2}"
+    is_valid, validation_msg = val_result[0], val_result[1]
+    if not is_valid:
+        return False, sql_query, f"SQL validation failed: {validation_msg}"
+    return True, sql_query, validation_msg
+
+def fetch_table_versions(db_info, tables):
+    """(UPDATE_TIME, row count) per table from information_schema, used to invalidate cached results.
+    tables are names from sql_tables ('table' in the current database or 'db.table'); the result is
+    keyed by the lower-cased name as given, and tables MySQL doesn't report are left out."""
+    conn = get_pooled_connection(db_info)
+    try:
+        cursor = conn.cursor()
+        conditions, params = [], []
+        for table in tables:
+            schema, _, name = table.rpartition('.')
+            conditions.append("(TABLE_SCHEMA = %s AND TABLE_NAME = %s)" if schema else "(TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s)")
+            params.extend([schema, name] if schema else [name])
+        cursor.execute(
+            "SELECT TABLE_SCHEMA, TABLE_NAME, UPDATE_TIME, TABLE_ROWS, TABLE_SCHEMA = DATABASE() "
+            f"FROM information_schema.TABLES WHERE {' OR '.join(conditions)}",
+            params
+        )
+        versions = {}
+        for schema, name, update_time, table_rows, current in cursor.fetchall():
+            version = (str(update_time), table_rows)
+            versions[f"{schema}.{name}".lower()] = version
+            if current:
+                versions[str(name).lower()] = version
+        return {table: versions[table] for table in tables if table in versions}
+    finally:
+        conn.close()
+
+def count_query_rows(sql_query, db_info, role=None):
+    """True row count of a query via COUNT(*) over it as a derived table (None if MySQL rejects the wrap)"""
+    conn = get_pooled_connection(db_info, role=role)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM ({sql_query.strip().rstrip(';')}) AS counted_result")
+        return int(cursor.fetchone()[0])
+    except Exception as e:
+        print(f"Could not count result rows: {e}")
+        return None
+    finally:
+        conn.close()
+
+def stream_sql_query(sql_query, db_info, role=None, max_rows=MAX_RESULT_ROWS, page_size=STREAM_PAGE_SIZE, on_page=None):
+    """Execute a MySQL query on an unbuffered cursor and fetch it page by page, stopping at max_rows.
+    on_page(page_df, rows_fetched) is called as soon as each page arrives. The returned DataFrame
+    carries attrs 'total_rows' (true count, None if unknown) and 'truncated'."""
+    conn = get_pooled_connection(db_info, role=role)
+    pages = []
+    columns = []
+    fetched = 0
+    truncated = False
+    try:
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(sql_query)
+        if cursor.with_rows:
+            columns = list(cursor.column_names)
+            while fetched < max_rows:
+                rows = cursor.fetchmany(min(page_size, max_rows - fetched))
+                if not rows:
+                    break
+                page = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+                pages.append(page)
+                fetched += len(rows)
+                if on_page is not None:
+                    on_page(page, fetched)
+            if fetched >= max_rows:
+                truncated = cursor.fetchone() is not None
+    except Exception:
+        conn.discard()
+        raise
+    if truncated:
+        # Don't drain millions of unread rows over the wire: drop the connection instead
+        conn.discard()
+    else:
+        conn.close()
+    df = pd.concat(pages, ignore_index=True) if pages else pd.DataFrame(columns=columns)
+    df.attrs['truncated'] = truncated
+    df.attrs['total_rows'] = count_query_rows(sql_query, db_info, role=role) if truncated else fetched
+    return df
+
+def execute_sql_safely(sql_query, db_type, db_info, result_cache=None, policy_key=None, role=None, max_rows=None, on_page=None):
+    """Execute SQL query with better error handling for SQLite or MySQL.
+    For MySQL, results are served from / stored in result_cache when one is given, and are streamed
+    in pages and capped at max_rows when it is set (see stream_sql_query)."""
     conn = None
     try:
         if db_type == 'SQLite':
@@ -185,11 +309,22 @@ def execute_sql_safely(sql_query, db_type, db_info):
             conn.execute("PRAGMA journal_mode = WAL")
             df = pd.read_sql_query(sql_query, conn)
         elif db_type == 'MySQL':
-            conn = mysql.connector.connect(**db_info)
-            df = pd.read_sql(sql_query, conn)
+            version_loader = lambda tables: fetch_table_versions(db_info, tables)
+            if result_cache is not None:
+                cached_df = result_cache.get(sql_query, policy_key, version_loader)
+                if cached_df is not None:
+                    return True, cached_df, None
+            if max_rows is not None:
+                df = stream_sql_query(sql_query, db_info, role=role, max_rows=max_rows, on_page=on_page)
+            else:
+                conn = get_pooled_connection(db_info, role=role)
+                df = pd.read_sql(sql_query, conn)
+            if result_cache is not None:
+                result_cache.put(sql_query, policy_key, df, version_loader)
         else:
             return False, None, f"Unsupported DB type: {db_type}"
-        conn.close()
+        if conn is not None:
+            conn.close()
         return True, df, None
     except Exception as e:
         if conn is not None:
@@ -197,75 +332,114 @@ def execute_sql_safely(sql_query, db_type, db_info):
         return False, None, f"Unexpected error: {str(e)}"
 
 class QueryAgent:
-    def __init__(self, db_type, db_info, data_dict, role_access):
+    def __init__(self, db_type, db_info, data_dict, role_access, concurrent_generation=True, sql_cache=None, result_cache=None,
+                 max_result_rows=MAX_RESULT_ROWS, embedder=None, value_index=None, column_stats=None,
+                 schema_selection=SCHEMA_SELECTION):
         self.db_type = db_type
         self.db_info = db_info
         self.data_dict = data_dict
         self.role_access = role_access
-        # If data_dict is a DataFrame, pass it to SchemaEmbedder; else, use default path
-        if isinstance(data_dict, pd.DataFrame):
+        # Semantic SQL cache; entries are keyed by the data dictionary / role access version
+        self.sql_cache = sql_cache if sql_cache is not None else SQL_CACHE
+        self.schema_version = frame_fingerprint(data_dict, role_access)
+        # Result-set cache keyed on normalized SQL + column policy, invalidated per table
+        self.result_cache = result_cache if result_cache is not None else RESULT_CACHE
+        # Stream MySQL results page by page and keep at most this many rows (None loads everything)
+        self.max_result_rows = max_result_rows
+        # Race the RAG and full-schema generations instead of running them back to back
+        self.concurrent_generation = concurrent_generation
+        self._stats_lock = threading.Lock()
+        self.generation_stats = {
+            s: {'runs': 0, 'wins': 0, 'latency_total': 0.0, 'latency_last': None} for s in GENERATION_STRATEGIES
+        }
+        # Prompt schema narrowed to the question's tables / columns (see SchemaEmbedder.select_schema)
+        self.schema_selection = schema_selection
+        self.schema_selection_stats = {'narrowed': 0, 'fallbacks': 0, 'tables_total': 0}
+        # Questions answered with the generate_simple_sql fallback because the LLM gave no usable SQL
+        self.simple_sql_fallbacks = 0
+        # Prefer a shared embedder (see get_shared_embedder); else build one from data_dict or the default path
+        if embedder is not None:
+            self.embedder = embedder
+        elif isinstance(data_dict, pd.DataFrame):
             self.embedder = SchemaEmbedder(data_dict=data_dict)
         else:
             self.embedder = SchemaEmbedder('data/data_dictionary.xlsx')
+        # Distinct values of categorical columns, matched against question literals for the prompt
+        if value_index is not None:
+            self.value_index = value_index
+        else:
+            self.value_index = get_shared_value_index(db_info=db_info) if db_type == 'MySQL' else None
+        # Row counts / NDV / min-max / null ratio / top values per column (see enhanced_column_stats)
+        if column_stats is not None:
+            self.column_stats = column_stats
+        elif db_type == 'MySQL':
+            try:
+                self.column_stats = ColumnStatsCatalog.load(db_info)
+            except Exception as e:
+                print(f"Warning: Could not load column stats: {e}")
+                self.column_stats = ColumnStatsCatalog()
+        else:
+            self.column_stats = ColumnStatsCatalog()
 
-    def get_connection(self):
+    def get_connection(self, role=None):
         if self.db_type == 'SQLite':
             return sqlite3.connect(self.db_info)
         elif self.db_type == 'MySQL':
-            return mysql.connector.connect(**self.db_info)
+            return get_pooled_connection(self.db_info, role=role)
         else:
             raise ValueError('Unsupported DB type')
 
-    def answer_query(self, question, allowed_tables, allowed_columns, previous_query=None, previous_result_columns=None):
-        # RAG: Retrieve top-k relevant schema/context and data rows
-        schema_results, data_row_results = self.embedder.search(question, top_k=5, data_row_k=3)
-        rag_context = ''
-        if schema_results:
-            rag_context += '### RELEVANT SCHEMA CONTEXT\n' + format_context_rows(schema_results) + '\n'
-        if data_row_results:
-            rag_context += '\n### RELEVANT DATA ROWS (EXAMPLES)\n' + '\n'.join(str(r) for r in data_row_results) + '\n'
-        
-        # Use LLM to generate SQL with both full schema and RAG context
-        sql_query_rag = generate_sql_llm(
-            question, allowed_tables, allowed_columns, self.data_dict, rag_context=rag_context,
-            previous_query=previous_query, previous_result_columns=previous_result_columns
-        )
-        sql_query_full = generate_sql_llm(
-            question, allowed_tables, allowed_columns, self.data_dict,
-            previous_query=previous_query, previous_result_columns=previous_result_columns
-        )
-        
-        # Prefer RAG SQL if it uses relevant tables/columns
-        sql_query = None
-        if sql_query_rag and filter_sql_to_allowed(sql_query_rag, allowed_tables, allowed_columns):
-            sql_query = sql_query_rag
-        elif sql_query_full and filter_sql_to_allowed(sql_query_full, allowed_tables, allowed_columns):
-            sql_query = sql_query_full
-        
-        if not sql_query:
-            return None, "You are not allowed to access the requested data or the query could not be generated.", None
-        
-        # Validate SQL before execution
-        val_result = validate_sql(sql_query, allowed_tables, allowed_columns)
-        if isinstance(val_result, tuple) and len(val_result) == 3 and val_result[0] == 'corrected':
-            # Auto-corrected query: use the corrected SQL and inform the user
-            correction_msg = val_result[1]
-            corrected_sql = val_result[2]
-            # Validate the corrected SQL (should not recurse infinitely)
-            is_valid2, validation_msg2 = validate_sql(corrected_sql, allowed_tables, allowed_columns)
-            if is_valid2 is True:
-                sql_query = corrected_sql
-                validation_msg = correction_msg + ' ' + validation_msg2
-            else:
-                return corrected_sql, f"SQL validation failed after correction: {validation_msg2}", None
+    def answer_query(self, question, allowed_tables, allowed_columns, previous_query=None, previous_result_columns=None, role=None,
+                     on_page=None):
+        # Encode the question once: shared by the SQL cache lookup and RAG search
+        q_emb = self.embedder.embed_question(question)
+        cached = None
+        policy_key = policy_fingerprint(role, allowed_tables, allowed_columns)
+        # Follow-up questions depend on the previous result, never serve them from cache
+        use_sql_cache = previous_query is None and previous_result_columns is None
+        if use_sql_cache:
+            cached = self.sql_cache.lookup(question, q_emb, policy_key, self.schema_version)
+        if cached is not None:
+            sql_query, validation_msg = cached
         else:
-            is_valid = val_result[0]
-            validation_msg = val_result[1]
-            if not is_valid:
-                return sql_query, f"SQL validation failed: {validation_msg}", None
+            # RAG: Retrieve top-k relevant schema/context and data rows from the role's tables only
+            schema_results, data_row_results = self.embedder.search(
+                question, top_k=5, data_row_k=3, q_emb=q_emb,
+                allowed_tables=allowed_tables, allowed_columns=allowed_columns
+            )
+            rag_context = ''
+            if schema_results:
+                rag_context += '### RELEVANT SCHEMA CONTEXT\n' + format_context_rows(schema_results) + '\n'
+            if data_row_results:
+                rag_context += '\n### RELEVANT DATA ROWS (EXAMPLES)\n' + '\n'.join(str(r) for r in data_row_results) + '\n'
+            value_matches = self.value_index.match(question, allowed_tables, allowed_columns) if self.value_index is not None else []
+            if value_matches:
+                rag_context += '\n### MATCHING COLUMN VALUES (use these exact literals)\n' + format_value_matches(value_matches) + '\n'
+            
+            # Two-stage table-then-column selection keeps large role schemas out of the prompt
+            prompt_schema = None
+            if self.schema_selection:
+                prompt_schema = self.embedder.select_schema(
+                    question, allowed_tables, allowed_columns, q_emb=q_emb,
+                    include_tables=[m['table'] for m in value_matches]
+                )
+            
+            ok, sql_query, validation_msg, fallback = self.generate_sql(
+                question, allowed_tables, allowed_columns, rag_context,
+                previous_query=previous_query, previous_result_columns=previous_result_columns,
+                prompt_schema=prompt_schema
+            )
+            if not ok:
+                return sql_query, validation_msg, None
+            # The simple fallback query only stands in for a failed LLM call: never serve it from cache
+            if use_sql_cache and not fallback:
+                self.sql_cache.store(question, q_emb, policy_key, self.schema_version, sql_query, validation_msg)
         
         # Execute SQL with better error handling
-        success, df, error_msg = execute_sql_safely(sql_query, self.db_type, self.db_info)
+        success, df, error_msg = execute_sql_safely(
+            sql_query, self.db_type, self.db_info, result_cache=self.result_cache, policy_key=policy_key, role=role,
+            max_rows=self.max_result_rows, on_page=on_page
+        )
         
         if not success:
             return sql_query, f"Error executing SQL: {error_msg}", None
@@ -274,10 +448,165 @@ class QueryAgent:
         response = self.generate_natural_response(question, df, sql_query)
         return sql_query, response, df
 
+    def generate_sql(self, question, allowed_tables, allowed_columns, rag_context, previous_query=None, previous_result_columns=None,
+                     prompt_schema=None):
+        """Generate SQL with the RAG and full-schema strategies and return the first vetted candidate.
+        prompt_schema = (tables, columns) from SchemaEmbedder.select_schema narrows the schema shown to
+        the LLM; candidates are always vetted against the role's allowed schema, and if none passes
+        (or the LLM gave no usable SQL), generation is retried once with the whole allowed schema.
+        Only if that also gives no usable SQL is generate_simple_sql's query used.
+        Returns (ok, sql, message, fallback) where (ok, sql, message) is like vet_sql_candidate and
+        fallback tells that the generate_simple_sql query was used (never cache it)."""
+        if prompt_schema is not None:
+            prompt_tables, prompt_columns = prompt_schema
+            try:
+                outcome = self._generate_with_schema(
+                    question, prompt_tables, prompt_columns, allowed_tables, allowed_columns, rag_context,
+                    previous_query, previous_result_columns
+                )
+            except SQLGenerationError as e:
+                print(f"LLM gave no usable SQL for the selected schema: {e}")
+                outcome = (False, None, str(e))
+            with self._stats_lock:
+                self.schema_selection_stats['narrowed'] += 1
+                self.schema_selection_stats['tables_total'] += len(prompt_tables)
+                if not outcome[0]:
+                    self.schema_selection_stats['fallbacks'] += 1
+            if outcome[0]:
+                return outcome + (False,)
+            print(f"SQL from the selected schema ({', '.join(prompt_tables)}) failed validation, retrying with the full schema")
+        try:
+            return self._generate_with_schema(
+                question, allowed_tables, allowed_columns, allowed_tables, allowed_columns, rag_context,
+                previous_query, previous_result_columns
+            ) + (False,)
+        except SQLGenerationError as e:
+            print(f"LLM gave no usable SQL ({e}), using a simple fallback query")
+            with self._stats_lock:
+                self.simple_sql_fallbacks += 1
+            sql_query = generate_simple_sql(question, allowed_tables, allowed_columns)
+            if sql_query is None:
+                return False, None, f"Could not generate SQL for this question: {e}", True
+            return vet_sql_candidate(sql_query, allowed_tables, allowed_columns) + (True,)
+
+    def _generate_with_schema(self, question, prompt_tables, prompt_columns, allowed_tables, allowed_columns, rag_context,
+                              previous_query, previous_result_columns):
+        def run(strategy):
+            return self._run_strategy(
+                strategy, question, prompt_tables, prompt_columns, rag_context,
+                previous_query, previous_result_columns
+            )
+        outcomes = {}
+        errors = {}
+        if self.concurrent_generation:
+            futures = {_GENERATION_EXECUTOR.submit(run, s): s for s in GENERATION_STRATEGIES}
+            for future in as_completed(futures):
+                strategy = futures[future]
+                try:
+                    candidate = future.result()
+                except Exception as e:
+                    errors[strategy] = e
+                    continue
+                outcomes[strategy] = vet_sql_candidate(candidate, allowed_tables, allowed_columns)
+                if outcomes[strategy][0]:
+                    # First valid candidate wins; a still-running loser finishes in the background and is ignored
+                    for other in futures:
+                        if other is not future:
+                            other.cancel()
+                    self._record_win(strategy)
+                    return outcomes[strategy]
+        else:
+            # Sequential mode: only fall through to the next strategy if the previous one was unusable
+            for strategy in GENERATION_STRATEGIES:
+                try:
+                    candidate = run(strategy)
+                except Exception as e:
+                    errors[strategy] = e
+                    continue
+                outcomes[strategy] = vet_sql_candidate(candidate, allowed_tables, allowed_columns)
+                if outcomes[strategy][0]:
+                    self._record_win(strategy)
+                    return outcomes[strategy]
+        for strategy in GENERATION_STRATEGIES:
+            if strategy in outcomes:
+                return outcomes[strategy]
+        # Every strategy raised (e.g. Ollama is down or gave no usable SQL): surface the preferred
+        # strategy's error, a connection failure first since a retry can't fix it
+        for error in [errors[s] for s in GENERATION_STRATEGIES]:
+            if not isinstance(error, SQLGenerationError):
+                raise error
+        raise errors[GENERATION_STRATEGIES[0]]
+
+    def _run_strategy(self, strategy, question, allowed_tables, allowed_columns, rag_context, previous_query, previous_result_columns):
+        start = time.perf_counter()
+        try:
+            return generate_sql_llm(
+                question, allowed_tables, allowed_columns, self.data_dict,
+                rag_context=rag_context if strategy == 'rag' else None,
+                previous_query=previous_query, previous_result_columns=previous_result_columns, fallback=False
+            )
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                stats = self.generation_stats[strategy]
+                stats['runs'] += 1
+                stats['latency_total'] += elapsed
+                stats['latency_last'] = elapsed
+
+    def _record_win(self, strategy):
+        with self._stats_lock:
+            self.generation_stats[strategy]['wins'] += 1
+
+    def get_generation_stats(self):
+        """Per-strategy win rate and latency (seconds) of SQL generation."""
+        with self._stats_lock:
+            report = {}
+            for strategy, stats in self.generation_stats.items():
+                runs = stats['runs']
+                report[strategy] = {
+                    'runs': runs,
+                    'wins': stats['wins'],
+                    'win_rate': stats['wins'] / runs if runs else 0.0,
+                    'avg_latency': stats['latency_total'] / runs if runs else None,
+                    'last_latency': stats['latency_last'],
+                }
+            return report
+
+    def get_schema_selection_stats(self):
+        """How often the prompt schema was narrowed, and how often that had to fall back to the full schema"""
+        with self._stats_lock:
+            stats = dict(self.schema_selection_stats)
+        narrowed = stats['narrowed']
+        tables_total = stats.pop('tables_total')
+        stats['fallback_rate'] = stats['fallbacks'] / narrowed if narrowed else 0.0
+        stats['avg_tables'] = tables_total / narrowed if narrowed else None
+        return stats
+
+    def get_metrics(self):
+        """Generation and cache counters, merged into st.session_state.metrics by the app"""
+        return {
+            'generation': self.get_generation_stats(),
+            'sql_cache': self.sql_cache.stats(),
+            'result_cache': self.result_cache.stats(),
+            'query_embeddings': self.embedder.query_encoder.stats() if self.embedder.query_encoder is not None else {},
+            'db_pool': pool_stats(self.db_info) if self.db_type == 'MySQL' else {},
+            'embedder': self.embedder.readiness(),
+            'value_index': self.value_index.stats() if self.value_index is not None else {},
+            'column_stats': self.column_stats.stats(),
+            'schema_selection': self.get_schema_selection_stats(),
+            'simple_sql_fallbacks': self.simple_sql_fallbacks,
+            'llm': get_llm_client().stats(),
+            'prompt': PROMPT_STATS.stats(),
+        }
+
     def generate_natural_response(self, question, df, sql_query):
         if df is None or df.empty:
             return "I couldn't find any data matching your query."
         row_count = len(df)
         col_count = len(df.columns)
+        if df.attrs.get('truncated'):
+            total_rows = df.attrs.get('total_rows')
+            total_str = f"{total_rows}" if total_rows is not None else f"more than {row_count}"
+            return f"I found {total_str} record(s) with {col_count} field(s) based on your query. Showing the first {row_count}. "
         response = f"I found {row_count} record(s) with {col_count} field(s) based on your query. "
         return response 
\ No newline at end of file
@@ -0,0 +1,128 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import pandas as pd
+
+# --- RESULT STORE CONFIG ---
+RESULTS_DIR = 'results'
+# How many result DataFrames per session stay in memory; older ones are reloaded from disk on demand
+RESULTS_IN_MEMORY = 3
+# Results at least this large (bytes) are written to disk straight away, not only when evicted
+RESULTS_SPILL_BYTES = 1024 * 1024
+# Session directories untouched for this long are removed at startup (sessions that never logged out)
+RESULTS_STALE_AFTER = 24 * 3600  # seconds
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    print("Warning: pyarrow not installed, chat results will be spilled as compressed pickles")
+    PARQUET_AVAILABLE = False
+
+class ResultStore:
+    """Per-session store for chat result DataFrames.
+
+    Keeps the most recent results in an in-memory LRU and spills the rest to compressed Parquet
+    files under RESULTS_DIR/<session_id>/. Row count, columns and attrs are kept for every result
+    so the UI can describe a result without loading it."""
+
+    def __init__(self, session_id=None, base_dir=RESULTS_DIR, max_in_memory=RESULTS_IN_MEMORY, spill_bytes=RESULTS_SPILL_BYTES):
+        self.session_id = session_id or uuid.uuid4().hex
+        self.session_dir = os.path.join(base_dir, self.session_id)
+        self.max_in_memory = max_in_memory
+        self.spill_bytes = spill_bytes
+        self._memory = OrderedDict()  # result_id -> DataFrame
+        self._meta = {}  # result_id -> {'rows', 'columns', 'attrs', 'path'}
+        self._lock = threading.Lock()
+
+    def _path(self, result_id):
+        ext = 'parquet' if PARQUET_AVAILABLE else 'pkl.gz'
+        return os.path.join(self.session_dir, f"{result_id}.{ext}")
+
+    def _spill(self, result_id, df):
+        meta = self._meta[result_id]
+        if meta['path'] is not None:
+            return
+        os.makedirs(self.session_dir, exist_ok=True)
+        path = self._path(result_id)
+        if PARQUET_AVAILABLE:
+            try:
+                df.to_parquet(path, compression='zstd', index=False)
+            except Exception as e:
+                # Mixed-type object columns can't always be mapped to Arrow types
+                print(f"Parquet spill failed ({e}), falling back to pickle")
+                path = os.path.join(self.session_dir, f"{result_id}.pkl.gz")
+                df.to_pickle(path, compression='gzip')
+        else:
+            df.to_pickle(path, compression='gzip')
+        meta['path'] = path
+
+    def _remember(self, result_id, df):
+        self._memory[result_id] = df
+        self._memory.move_to_end(result_id)
+        while len(self._memory) > self.max_in_memory:
+            old_id, old_df = self._memory.popitem(last=False)
+            self._spill(old_id, old_df)
+
+    def put(self, df):
+        """Store a result and return its id"""
+        result_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._meta[result_id] = {
+                'rows': len(df),
+                'columns': list(df.columns),
+                'attrs': dict(df.attrs),
+                'path': None,
+            }
+            if df.memory_usage(index=True, deep=True).sum() >= self.spill_bytes:
+                self._spill(result_id, df)
+            self._remember(result_id, df)
+        return result_id
+
+    def get(self, result_id):
+        """Return the DataFrame for result_id, reloading it from disk if it was evicted (None if unknown)"""
+        with self._lock:
+            if result_id in self._memory:
+                self._memory.move_to_end(result_id)
+                return self._memory[result_id]
+            meta = self._meta.get(result_id)
+            if meta is None or meta['path'] is None or not os.path.exists(meta['path']):
+                return None
+            if meta['path'].endswith('.parquet'):
+                df = pd.read_parquet(meta['path'])
+            else:
+                df = pd.read_pickle(meta['path'], compression='gzip')
+            df.attrs.update(meta['attrs'])
+            self._remember(result_id, df)
+            return df
+
+    def in_memory(self, result_id):
+        with self._lock:
+            return result_id in self._memory
+
+    def meta(self, result_id):
+        with self._lock:
+            return dict(self._meta.get(result_id, {}))
+
+    def clear(self):
+        """Drop every result of this session from memory and disk"""
+        with self._lock:
+            self._memory.clear()
+            self._meta.clear()
+            shutil.rmtree(self.session_dir, ignore_errors=True)
+
+def purge_stale_sessions(base_dir=RESULTS_DIR, max_age=RESULTS_STALE_AFTER):
+    """Remove session directories left behind by sessions that ended without logout / clear"""
+    if not os.path.isdir(base_dir):
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(base_dir):
+        path = os.path.join(base_dir, name)
+        try:
+            if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
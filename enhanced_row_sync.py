@@ -0,0 +1,227 @@
+import json
+import os
+import threading
+from enhanced_db_pool import get_connection
+from enhanced_embedding_cache import EMBEDDING_CACHE_DIR, text_hash
+
+# --- INCREMENTAL DATA-ROW SYNC CONFIG ---
+ROW_SYNC_STATE_PATH = os.path.join(EMBEDDING_CACHE_DIR, 'row_sync.json')
+# Rows kept per table with a primary key (None = the whole table); a larger table keeps its highest,
+# i.e. usually newest, keys so fresh inserts still reach data-row search
+ROW_SYNC_MAX_ROWS_PER_TABLE = 50000
+# Tables without a primary key have no stable row identity: they are re-read up to this many rows
+ROW_SYNC_FALLBACK_ROWS = 1000
+ROW_SYNC_FETCH_BATCH = 500
+# Tables that are part of the app's own metadata, not business data: never embedded, value-indexed or
+# counted in the data version ('column_stats' is enhanced_column_stats.COLUMN_STATS_TABLE)
+ROW_SYNC_SKIP_TABLES = {'data_dictionary', 'role_access', 'column_stats'}
+
+def format_row_text(table, columns, values):
+    """Text embedded for one data row (same layout the embedder has always used)"""
+    return f"table: {table} | " + ' | '.join([f"{col}: {val}" for col, val in zip(columns, values)])
+
+def _pk_key(pk_values):
+    return '\x1f'.join(str(v) for v in pk_values)
+
+class RowSync:
+    """Keeps every table's rows (as strings) in step with MySQL.
+
+    Each table's primary key and a server-side MD5 of every row are tracked, so a sync only downloads
+    rows whose hash changed or that are new, and drops rows that were deleted. Tables whose
+    information_schema UPDATE_TIME and row count are unchanged since the last sync are skipped.
+    Only primary key -> (row hash, vector id) is persisted, never row values: the vector id is the
+    embedding cache key of the row's text. Row values live in memory, so the first sync of a process
+    downloads each table's rows once and later syncs re-fetch changed rows by primary key."""
+
+    def __init__(self, state_path=ROW_SYNC_STATE_PATH, db_info=None,
+                 max_rows_per_table=ROW_SYNC_MAX_ROWS_PER_TABLE, fallback_rows=ROW_SYNC_FALLBACK_ROWS):
+        self.state_path = state_path
+        self.db_info = db_info
+        self.max_rows_per_table = max_rows_per_table
+        self.fallback_rows = fallback_rows
+        self._lock = threading.Lock()
+        # table -> {'pk': [...], 'columns': [...], 'version': [...], 'rows': {pk_key: [row_hash, vector_id]}}
+        self.tables = {}
+        # table -> {pk_key: [values]}, for the rows in self.tables; not persisted
+        self.values = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                self.tables = json.load(f)
+        except Exception as e:
+            print(f"Could not load row sync state {self.state_path}: {e}")
+            self.tables = {}
+
+    def _save(self):
+        # Write to a temp file then rename, so a crash never leaves a half-written state behind
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.tables, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+
+    def sync(self):
+        """Bring the stored rows in line with MySQL. Returns counts of added/updated/deleted rows."""
+        stats = {'tables': 0, 'skipped': 0, 'added': 0, 'updated': 0, 'deleted': 0, 'fetched': 0}
+        with self._lock:
+            conn = get_connection(self.db_info)
+            try:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT TABLE_NAME, UPDATE_TIME, TABLE_ROWS FROM information_schema.TABLES "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE' ORDER BY TABLE_NAME"
+                )
+                versions = {name: [str(update_time), rows] for name, update_time, rows in cursor.fetchall()
+                            if name not in ROW_SYNC_SKIP_TABLES}
+                for table in [t for t in self.tables if t not in versions]:
+                    stats['deleted'] += len(self.tables.pop(table)['rows'])
+                    self.values.pop(table, None)
+                for table, version in versions.items():
+                    stats['tables'] += 1
+                    state = self.tables.get(table)
+                    # UPDATE_TIME is NULL for InnoDB tables untouched since server start: can't trust it then.
+                    # A table whose rows this process hasn't read yet is synced even when unchanged.
+                    if (state is not None and table in self.values and version[0] != 'None'
+                            and state.get('version') == version):
+                        stats['skipped'] += 1
+                        continue
+                    self._sync_table(conn, table, version, stats)
+            finally:
+                conn.close()
+            if stats['skipped'] < stats['tables'] or stats['deleted']:
+                self._save()
+        print(f"Row sync: {stats}")
+        return stats
+
+    def _table_layout(self, conn, table):
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION", (table,)
+        )
+        columns = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND CONSTRAINT_NAME = 'PRIMARY' "
+            "ORDER BY ORDINAL_POSITION", (table,)
+        )
+        pk = [row[0] for row in cursor.fetchall()]
+        return columns, pk
+
+    def _sync_table(self, conn, table, version, stats):
+        columns, pk = self._table_layout(conn, table)
+        old = self.tables.get(table)
+        if old is None or old.get('columns') != columns or old.get('pk') != pk:
+            # New table or changed layout: every row is new
+            if old is not None:
+                stats['deleted'] += len(old['rows'])
+            old = {'rows': {}}
+        old_values = self.values.get(table, {})
+        col_list = ', '.join(f"`{c}`" for c in columns)
+        row_hash_sql = "MD5(CONCAT_WS('|', " + ', '.join(f"IFNULL(CAST(`{c}` AS CHAR), '\\\\N')" for c in columns) + "))"
+        if not pk:
+            # No stable identity: re-read a bounded sample, keyed by row hash
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {row_hash_sql}, {col_list} FROM `{table}` LIMIT {int(self.fallback_rows)}")
+            rows, values = {}, {}
+            for row in cursor.fetchall():
+                values[row[0]] = [str(v) for v in row[1:]]
+                rows[row[0]] = [row[0], text_hash(format_row_text(table, columns, values[row[0]]))]
+            stats['added'] += len(set(rows) - set(old['rows']))
+            stats['deleted'] += len(set(old['rows']) - set(rows))
+            stats['fetched'] += len(rows)
+            self.tables[table] = {'pk': pk, 'columns': columns, 'version': version, 'rows': rows}
+            self.values[table] = values
+            return
+        # 1. Scan primary keys + row hashes (small) over an unbuffered cursor
+        pk_list = ', '.join(f"`{c}`" for c in pk)
+        if self.max_rows_per_table:
+            order = ', '.join(f"`{c}` DESC" for c in pk) + f" LIMIT {int(self.max_rows_per_table)}"
+        else:
+            order = pk_list
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(f"SELECT {pk_list}, {row_hash_sql} FROM `{table}` ORDER BY {order}")
+        current = {}
+        while True:
+            batch = cursor.fetchmany(ROW_SYNC_FETCH_BATCH * 10)
+            if not batch:
+                break
+            for row in batch:
+                current[_pk_key(row[:-1])] = (row[:-1], row[-1])
+        cursor.close()
+        if self.max_rows_per_table:
+            current = dict(reversed(list(current.items())))
+        old_rows = old['rows']
+        # Rows whose values this process doesn't hold yet are downloaded too, but count as unchanged
+        changed = [key for key, (_, row_hash) in current.items()
+                   if key not in old_rows or old_rows[key][0] != row_hash or key not in old_values]
+        # 2. Download only new / changed rows
+        fetched = {}
+        cursor = conn.cursor()
+        for start in range(0, len(changed), ROW_SYNC_FETCH_BATCH):
+            batch_keys = changed[start:start + ROW_SYNC_FETCH_BATCH]
+            params = []
+            for key in batch_keys:
+                params.extend(current[key][0])
+            if len(pk) == 1:
+                where = f"`{pk[0]}` IN ({', '.join(['%s'] * len(batch_keys))})"
+            else:
+                tuple_sql = '(' + ', '.join(['%s'] * len(pk)) + ')'
+                where = f"({pk_list}) IN ({', '.join([tuple_sql] * len(batch_keys))})"
+            cursor.execute(f"SELECT {col_list} FROM `{table}` WHERE {where}", params)
+            pk_idx = [columns.index(c) for c in pk]
+            for row in cursor.fetchall():
+                fetched[_pk_key([row[i] for i in pk_idx])] = [str(v) for v in row]
+        stats['fetched'] += len(fetched)
+        # 3. Rebuild the table's rows in primary-key order: keep, replace, add, and drop deleted ones
+        rows, values = {}, {}
+        for key, (_, row_hash) in current.items():
+            if key in fetched:
+                if key not in old_rows:
+                    stats['added'] += 1
+                elif old_rows[key][0] != row_hash:
+                    stats['updated'] += 1
+                values[key] = fetched[key]
+                rows[key] = [row_hash, text_hash(format_row_text(table, columns, values[key]))]
+            elif key in old_values and old_rows[key][0] == row_hash:
+                rows[key] = old_rows[key]
+                values[key] = old_values[key]
+        stats['deleted'] += len(set(old_rows) - set(current))
+        self.tables[table] = {'pk': pk, 'columns': columns, 'version': version, 'rows': rows}
+        self.values[table] = values
+
+    def iter_rows(self):
+        """Yield (table, columns, values) for every row read by this process, tables in name order"""
+        for table, columns, rows in self.iter_tables():
+            for values in rows:
+                yield table, columns, values
+
+    def iter_tables(self):
+        """Yield (table, columns, rows) per table in name order, each row a list of string values"""
+        with self._lock:
+            snapshot = []
+            for table in sorted(self.tables):
+                state = self.tables[table]
+                values = self.values.get(table, {})
+                snapshot.append((table, state['columns'], [values[key] for key in state['rows'] if key in values]))
+        yield from snapshot
+
+    def texts(self):
+        return [format_row_text(table, columns, values) for table, columns, values in self.iter_rows()]
+
+_ROW_SYNC_LOCK = threading.Lock()
+_SHARED_ROW_SYNC = {'row_sync': None}
+
+def get_shared_row_sync():
+    """Process-wide RowSync. The rows it holds in memory outlive the shared embedder, so rebuilding
+    the embedder after a data change only downloads the rows that changed."""
+    with _ROW_SYNC_LOCK:
+        if _SHARED_ROW_SYNC['row_sync'] is None:
+            _SHARED_ROW_SYNC['row_sync'] = RowSync()
+        return _SHARED_ROW_SYNC['row_sync']
@@ -0,0 +1,209 @@
+import bisect
+import difflib
+import json
+import os
+import re
+import threading
+from enhanced_cache import allowed_column_set
+from enhanced_db_pool import get_connection
+from enhanced_embedding_cache import EMBEDDING_CACHE_DIR
+from enhanced_lexical_index import STOPWORDS
+from enhanced_row_sync import ROW_SYNC_SKIP_TABLES
+
+# --- COLUMN VALUE INDEX CONFIG ---
+VALUE_INDEX_STATE_PATH = os.path.join(EMBEDDING_CACHE_DIR, 'value_index.json')
+# Only string columns with at most this many distinct values are indexed (categories, cities, codes)
+VALUE_INDEX_MAX_DISTINCT = 200
+VALUE_INDEX_MAX_VALUE_LEN = 64
+VALUE_INDEX_COLUMN_TYPES = ('char', 'varchar', 'enum', 'set')
+# Matches returned per question, and the similarity a misspelt word needs to match a value
+VALUE_MATCH_MAX = 8
+VALUE_MATCH_FUZZY_CUTOFF = 0.8
+# Question phrases of up to this many words are looked up ("new delhi", "fixed deposit")
+VALUE_MATCH_MAX_WORDS = 3
+
+def normalize_value(text):
+    return ' '.join(re.findall(r'[a-z0-9]+', str(text).lower()))
+
+class ValueIndex:
+    """Distinct values of low-cardinality string columns, for grounding question literals.
+
+    Values are read with SELECT DISTINCT per column and persisted; refresh() only re-reads tables
+    whose information_schema UPDATE_TIME or row count changed. match() looks up the words and short
+    phrases of a question by exact, prefix and fuzzy match and returns the columns they belong to."""
+
+    def __init__(self, state_path=VALUE_INDEX_STATE_PATH, db_info=None, max_distinct=VALUE_INDEX_MAX_DISTINCT):
+        self.state_path = state_path
+        self.db_info = db_info
+        self.max_distinct = max_distinct
+        self._refresh_lock = threading.Lock()
+        # table -> {'version': [...], 'columns': {column: [values]}, 'high_cardinality': [columns]}
+        self.tables = {}
+        self._keys = []  # sorted normalised values
+        self._entries = {}  # normalised value -> [(table, column, value)]
+        self._load()
+        self._rebuild()
+
+    def _load(self):
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                self.tables = json.load(f)
+        except Exception as e:
+            print(f"Could not load value index {self.state_path}: {e}")
+            self.tables = {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.tables, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _rebuild(self):
+        entries = {}
+        for table, state in self.tables.items():
+            for column, values in state['columns'].items():
+                for value in values:
+                    key = normalize_value(value)
+                    if key:
+                        entries.setdefault(key, []).append((table, column, value))
+        # Swap in complete structures so concurrent match() calls never see a half-built index
+        self._entries, self._keys = entries, sorted(entries)
+
+    def refresh(self):
+        """Re-read the distinct values of changed tables. Returns counts of scanned/skipped tables."""
+        stats = {'tables': 0, 'skipped': 0, 'columns': 0}
+        with self._refresh_lock:
+            conn = get_connection(self.db_info)
+            try:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT TABLE_NAME, UPDATE_TIME, TABLE_ROWS FROM information_schema.TABLES "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE' ORDER BY TABLE_NAME"
+                )
+                versions = {name: [str(update_time), rows] for name, update_time, rows in cursor.fetchall()
+                            if name not in ROW_SYNC_SKIP_TABLES}
+                tables = {t: s for t, s in self.tables.items() if t in versions}
+                for table, version in versions.items():
+                    stats['tables'] += 1
+                    state = tables.get(table)
+                    # UPDATE_TIME is NULL for InnoDB tables untouched since server start: can't trust it then
+                    if state is not None and version[0] != 'None' and state.get('version') == version:
+                        stats['skipped'] += 1
+                        continue
+                    tables[table] = self._scan_table(conn, table, version)
+                    stats['columns'] += len(tables[table]['columns'])
+            finally:
+                conn.close()
+            self.tables = tables
+            self._save()
+            self._rebuild()
+        print(f"Value index refresh: {stats}")
+        return stats
+
+    def refresh_async(self):
+        """Refresh in a background thread; match() keeps serving the previous values meanwhile"""
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Warning: Value index refresh failed: {e}")
+        threading.Thread(target=run, name='value-index-refresh', daemon=True).start()
+
+    def _scan_table(self, conn, table, version):
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() "
+            f"AND TABLE_NAME = %s AND DATA_TYPE IN ({', '.join(['%s'] * len(VALUE_INDEX_COLUMN_TYPES))}) "
+            "ORDER BY ORDINAL_POSITION", (table, *VALUE_INDEX_COLUMN_TYPES)
+        )
+        state = {'version': version, 'columns': {}, 'high_cardinality': []}
+        for (column,) in cursor.fetchall():
+            # LIMIT max + 1 tells a low-cardinality column from a high one without counting all values
+            cursor.execute(
+                f"SELECT DISTINCT `{column}` FROM `{table}` WHERE `{column}` IS NOT NULL AND `{column}` <> '' "
+                f"LIMIT {int(self.max_distinct) + 1}"
+            )
+            values = [str(row[0]) for row in cursor.fetchall()]
+            if len(values) > self.max_distinct:
+                state['high_cardinality'].append(column)
+                continue
+            values = [v for v in values if len(v) <= VALUE_INDEX_MAX_VALUE_LEN]
+            if values:
+                state['columns'][column] = values
+        return state
+
+    def _lookup(self, phrase):
+        """(key, score, kind) candidates for one normalised question phrase"""
+        if phrase in self._entries:
+            return [(phrase, 1.0, 'exact')]
+        found = []
+        if len(phrase) >= 3:
+            # Values starting with the phrase ("mum" -> "mumbai") and values the phrase starts with
+            # ("savings" -> "saving")
+            start = bisect.bisect_left(self._keys, phrase)
+            for key in self._keys[start:start + 5]:
+                if not key.startswith(phrase):
+                    break
+                found.append((key, len(phrase) / len(key), 'prefix'))
+            for n in range(len(phrase) - 1, max(2, len(phrase) - 4), -1):
+                if phrase[:n] in self._entries:
+                    found.append((phrase[:n], n / len(phrase), 'prefix'))
+                    break
+        if not found and len(phrase) >= 4:
+            for key in difflib.get_close_matches(phrase, self._keys, n=3, cutoff=VALUE_MATCH_FUZZY_CUTOFF):
+                found.append((key, difflib.SequenceMatcher(None, phrase, key).ratio(), 'fuzzy'))
+        return found
+
+    def match(self, question, allowed_tables=None, allowed_columns=None, limit=VALUE_MATCH_MAX):
+        """Column values mentioned in question, best first:
+        [{'table', 'column', 'value', 'score', 'match': 'exact' | 'prefix' | 'fuzzy'}]"""
+        if not self._keys:
+            return []
+        allowed = None if allowed_tables is None else {str(t).lower(): t for t in allowed_tables}
+        words = normalize_value(question).split()
+        best = {}
+        for size in range(min(VALUE_MATCH_MAX_WORDS, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                gram = words[start:start + size]
+                if all(w in STOPWORDS for w in gram):
+                    continue
+                for key, score, kind in self._lookup(' '.join(gram)):
+                    for table, column, value in self._entries.get(key, []):
+                        if allowed is not None:
+                            if table.lower() not in allowed:
+                                continue
+                            visible = allowed_column_set(allowed[table.lower()], allowed_columns)
+                            if visible is not None and column.lower() not in visible:
+                                continue
+                        item = (table, column, value)
+                        if item not in best or score > best[item]['score']:
+                            best[item] = {'table': table, 'column': column, 'value': value, 'score': score, 'match': kind}
+        return sorted(best.values(), key=lambda m: (-m['score'], -len(m['value'])))[:limit]
+
+    def stats(self):
+        return {
+            'tables': len(self.tables),
+            'columns': sum(len(s['columns']) for s in self.tables.values()),
+            'values': sum(len(v) for s in self.tables.values() for v in s['columns'].values()),
+        }
+
+def format_value_matches(matches):
+    """Prompt lines for ValueIndex.match() results"""
+    return '\n'.join(f"- {m['table']}.{m['column']} = '{m['value']}'" for m in matches)
+
+_VALUE_INDEX_LOCK = threading.Lock()
+_SHARED_VALUE_INDEX = {'version': None, 'index': None}
+
+def get_shared_value_index(version=None, db_info=None):
+    """Process-wide ValueIndex; a refresh runs in the background whenever version (e.g. the data
+    version from fetch_versions()) changes or is unknown"""
+    with _VALUE_INDEX_LOCK:
+        if _SHARED_VALUE_INDEX['index'] is None:
+            _SHARED_VALUE_INDEX['index'] = ValueIndex(db_info=db_info)
+        if version is None or version != _SHARED_VALUE_INDEX['version']:
+            _SHARED_VALUE_INDEX['version'] = version
+            _SHARED_VALUE_INDEX['index'].refresh_async()
+        return _SHARED_VALUE_INDEX['index']
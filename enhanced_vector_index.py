@@ -0,0 +1,279 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    faiss = None
+    FAISS_AVAILABLE = False
+
+# --- VECTOR INDEX CONFIG ---
+# 'exact' (brute-force cosine, same ranking as util.semantic_search), or FAISS 'flat', 'ivf', 'hnsw'
+VECTOR_INDEX_BACKEND = 'hnsw'
+# Corpora smaller than this are always searched exactly: an ANN index only pays off on large corpora
+VECTOR_INDEX_MIN_SIZE = 10000
+# IVF: number of clusters (None = 4 * sqrt(n)) and clusters probed per query (higher = better recall, slower)
+IVF_NLIST = None
+IVF_NPROBE = 16
+# HNSW: graph degree and build-time beam (fixed at build), search-time beam (higher = better recall, slower)
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+# Stored precision of data-row vectors: None (float32), 'float16', or 'int8' (one float32 scale per vector)
+VECTOR_QUANTIZATION = None
+# Re-score the best quantized candidates against the original float32 vectors (read from the
+# memory-mapped embedding cache, so only the candidate rows are touched)
+QUANTIZED_RERANK = True
+# Candidates re-scored per requested result
+QUANTIZED_RERANK_CANDIDATES = 4
+# Rows converted to float32 at a time while scanning quantized vectors (bounds temporary memory)
+QUANTIZED_SCAN_CHUNK = 8192
+QUANTIZATION_TYPES = ('float16', 'int8')
+
+def to_numpy(vectors):
+    """float32 ndarray from a numpy array, memmap or torch tensor (no copy when already float32 numpy)"""
+    if hasattr(vectors, 'detach'):
+        vectors = vectors.detach().cpu().numpy()
+    return np.asarray(vectors, dtype=np.float32)
+
+def normalize_rows(vectors):
+    vectors = np.array(vectors, dtype=np.float32, copy=True)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def vectors_fingerprint(vectors):
+    return hashlib.sha1(np.ascontiguousarray(vectors).tobytes()).hexdigest()
+
+class ExactIndex:
+    """Brute-force cosine search over the vectors as given (memmaps are not copied)"""
+    backend = 'exact'
+
+    def __init__(self, vectors):
+        self.vectors = to_numpy(vectors)
+        norms = np.linalg.norm(self.vectors, axis=1)
+        norms[norms == 0] = 1.0
+        self._inv_norms = 1.0 / norms
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def search(self, query, k, subset=None):
+        """Return (ids, scores) of the k nearest vectors to a single query vector.
+        subset (array of ids) restricts the search to those vectors; returned ids stay global."""
+        query = to_numpy(query).reshape(-1)
+        query = query / (np.linalg.norm(query) or 1.0)
+        if subset is None:
+            scores = (self.vectors @ query) * self._inv_norms
+        else:
+            subset = np.asarray(subset, dtype=np.int64)
+            scores = (self.vectors[subset] @ query) * self._inv_norms[subset]
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return (top if subset is None else subset[top]), scores[top]
+
+def _top_k(scores, k):
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+class QuantizedIndex:
+    """Brute-force cosine search over a float16 or int8 copy of the L2-normalised vectors.
+
+    int8 codes carry one float32 scale per vector (max |component| / 127), so memory is about a
+    quarter (int8) or half (float16) of float32. Scores are computed chunk by chunk in float32."""
+    backend = 'exact'
+
+    def __init__(self, vectors, quantization='int8'):
+        if quantization not in QUANTIZATION_TYPES:
+            raise ValueError(f"Unknown vector quantization: {quantization}")
+        self.quantization = quantization
+        vectors = to_numpy(vectors)
+        n = len(vectors)
+        self.codes = np.empty(vectors.shape, dtype=np.float16 if quantization == 'float16' else np.int8)
+        self.scales = np.empty(n, dtype=np.float32) if quantization == 'int8' else None
+        for start in range(0, n, QUANTIZED_SCAN_CHUNK):
+            end = start + QUANTIZED_SCAN_CHUNK
+            chunk = normalize_rows(vectors[start:end])
+            if self.scales is None:
+                self.codes[start:end] = chunk
+            else:
+                scale = np.abs(chunk).max(axis=1) / 127.0
+                scale[scale == 0] = 1.0
+                self.codes[start:end] = np.round(chunk / scale[:, None])
+                self.scales[start:end] = scale
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def search(self, query, k):
+        query = to_numpy(query).reshape(-1)
+        query = query / (np.linalg.norm(query) or 1.0)
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), QUANTIZED_SCAN_CHUNK):
+            end = start + QUANTIZED_SCAN_CHUNK
+            scores[start:end] = self.codes[start:end].astype(np.float32) @ query
+        if self.scales is not None:
+            scores *= self.scales
+        top = _top_k(scores, k)
+        return top, scores[top]
+
+class RerankedIndex:
+    """Wraps an approximate (e.g. quantized) index: fetches extra candidates from it and orders
+    them by exact cosine similarity against the original float vectors"""
+
+    def __init__(self, index, vectors, candidates=QUANTIZED_RERANK_CANDIDATES):
+        self.index = index
+        self.backend = index.backend
+        self.vectors = vectors
+        self.candidates = candidates
+
+    def __len__(self):
+        return len(self.index)
+
+    def search(self, query, k):
+        ids, _ = self.index.search(query, k * self.candidates)
+        if len(ids) == 0:
+            return ids, np.empty(0, dtype=np.float32)
+        query = to_numpy(query).reshape(-1)
+        query = query / (np.linalg.norm(query) or 1.0)
+        ids = np.sort(ids)
+        rows = to_numpy(self.vectors[ids])
+        norms = np.linalg.norm(rows, axis=1)
+        norms[norms == 0] = 1.0
+        scores = (rows @ query) / norms
+        top = _top_k(scores, k)
+        return ids[top], scores[top]
+
+class FaissIndex:
+    """FAISS inner-product index over L2-normalised vectors (inner product == cosine similarity)"""
+
+    def __init__(self, backend, index):
+        self.backend = backend
+        self.index = index
+        self.set_search_params()
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def set_search_params(self, nprobe=None, ef_search=None):
+        if self.backend == 'ivf':
+            faiss.extract_index_ivf(self.index).nprobe = nprobe or IVF_NPROBE
+        elif self.backend == 'hnsw':
+            self.index.hnsw.efSearch = ef_search or HNSW_EF_SEARCH
+
+    @classmethod
+    def build(cls, vectors, backend, nlist=None, hnsw_m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, quantization=None):
+        vectors = normalize_rows(to_numpy(vectors))
+        n, dim = vectors.shape
+        # Scalar-quantized variants store float16 or 8-bit codes instead of float32 vectors
+        qtype = None
+        if quantization is not None:
+            if quantization not in QUANTIZATION_TYPES:
+                raise ValueError(f"Unknown vector quantization: {quantization}")
+            qtype = faiss.ScalarQuantizer.QT_fp16 if quantization == 'float16' else faiss.ScalarQuantizer.QT_8bit
+        if backend == 'flat':
+            if qtype is None:
+                index = faiss.IndexFlatIP(dim)
+            else:
+                index = faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_INNER_PRODUCT)
+        elif backend == 'ivf':
+            nlist = nlist or IVF_NLIST or max(1, int(4 * np.sqrt(n)))
+            nlist = min(nlist, n)
+            quantizer = faiss.IndexFlatIP(dim)
+            if qtype is None:
+                index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            else:
+                index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, qtype, faiss.METRIC_INNER_PRODUCT)
+        elif backend == 'hnsw':
+            if qtype is None:
+                index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            else:
+                index = faiss.IndexHNSWSQ(dim, qtype, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = ef_construction
+        else:
+            raise ValueError(f"Unknown vector index backend: {backend}")
+        if not index.is_trained:
+            index.train(vectors)
+        index.add(vectors)
+        return cls(backend, index)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        faiss.write_index(self.index, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, backend):
+        try:
+            # Memory-map the stored vectors instead of reading them into RAM
+            index = faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except Exception:
+            index = faiss.read_index(path)
+        return cls(backend, index)
+
+    def search(self, query, k):
+        query = normalize_rows(to_numpy(query).reshape(1, -1))
+        k = min(k, self.index.ntotal)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores, ids = self.index.search(query, k)
+        keep = ids[0] >= 0
+        return ids[0][keep], scores[0][keep]
+
+def build_index(vectors, backend=VECTOR_INDEX_BACKEND, cache_path=None, fingerprint=None,
+                min_size=VECTOR_INDEX_MIN_SIZE, quantization=VECTOR_QUANTIZATION, rerank=QUANTIZED_RERANK,
+                **build_params):
+    """Return a search index over vectors.
+
+    Small corpora, backend 'exact' or a missing faiss all give an ExactIndex (a QuantizedIndex with
+    quantization). FAISS indexes are persisted to cache_path and memory-mapped back on the next start
+    when the fingerprint of the vectors and the build parameters still match. Quantized indexes
+    re-rank their top candidates against vectors when rerank is set."""
+    if backend == 'exact' or len(vectors) < min_size or not FAISS_AVAILABLE:
+        if backend not in ('exact', None) and len(vectors) >= min_size:
+            print("Warning: faiss not installed, using exact vector search")
+        if quantization is None:
+            return ExactIndex(vectors)
+        index = QuantizedIndex(vectors, quantization)
+        return RerankedIndex(index, vectors) if rerank else index
+    meta = {
+        'backend': backend,
+        'quantization': quantization,
+        'fingerprint': fingerprint or vectors_fingerprint(to_numpy(vectors)),
+        'params': {k: build_params[k] for k in sorted(build_params)},
+        'count': len(vectors),
+    }
+    meta_path = cache_path + '.json' if cache_path else None
+    index = None
+    if cache_path and os.path.exists(cache_path) and os.path.exists(meta_path):
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                if json.load(f) == meta:
+                    index = FaissIndex.load(cache_path, backend)
+        except Exception as e:
+            print(f"Could not load vector index {cache_path}: {e}")
+    if index is None:
+        index = FaissIndex.build(vectors, backend, quantization=quantization, **build_params)
+        print(f"Built {backend} vector index over {len(vectors)} vectors" + (f" ({quantization})" if quantization else ''))
+        if cache_path:
+            try:
+                index.save(cache_path)
+                with open(meta_path, 'w', encoding='utf-8') as f:
+                    json.dump(meta, f)
+            except Exception as e:
+                print(f"Could not persist vector index {cache_path}: {e}")
+    return RerankedIndex(index, vectors) if quantization is not None and rerank else index
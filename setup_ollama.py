@@ -8,6 +8,7 @@ import subprocess
 import sys
 import time
 import os
+from enhanced_llm_client import SQL_MODEL, get_llm_client
 
 def check_ollama_installed():
     """Check if Ollama is installed"""
@@ -26,7 +27,7 @@ def check_ollama_installed():
 def check_ollama_running():
     """Check if Ollama server is running"""
     try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
+        response = get_llm_client().get("/api/tags", read_timeout=5)
         if response.status_code == 200:
             print("✅ Ollama server is running")
             return True
@@ -63,7 +64,7 @@ def start_ollama_server():
 def check_sqlcoder_model():
     """Check if SQLCoder model is installed"""
     try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
+        response = get_llm_client().get("/api/tags", read_timeout=5)
         if response.status_code == 200:
             models = response.json().get('models', [])
             sqlcoder_found = any(model.get('name', '').startswith('sqlcoder') for model in models)
@@ -115,7 +116,7 @@ Show all records from test table.
 """
     
     payload = {
-        "model": "sqlcoder",
+        "model": SQL_MODEL,
         "prompt": test_prompt,
         "stream": False,
         "options": {
@@ -125,8 +126,7 @@ Show all records from test table.
     }
     
     try:
-        response = requests.post("http://localhost:11434/api/generate", 
-                               json=payload, timeout=30)
+        response = get_llm_client().generate(payload, read_timeout=30)
         
         if response.status_code == 200:
             result = response.json()